@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """Seau à jetons: `rate` jetons par seconde, au plus `burst` en réserve."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self, now):
+        """Consomme un jeton; retourne 0 si accepté, sinon le délai (s) avant le prochain jeton."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60
+
+
+class AdmissionRejected(Exception):
+    """Requête refusée par le contrôle d'admission."""
+
+    def __init__(self, reason, retry_after, status=503):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(retry_after + 0.999))
+        self.status = status
+
+
+class AdmissionController:
+    """Contrôle d'admission: limites de débit (globale et par client) et callbacks simultanés bornés.
+
+    Les callbacks au-delà de `max_concurrent` attendent dans une file d'au plus `max_queue`
+    places pendant `queue_timeout` secondes; au-delà, la requête est délestée.
+    """
+
+    def __init__(self, global_rate=50, global_burst=100, client_rate=1, client_burst=10,
+                 max_clients=10000, max_concurrent=20, max_queue=20, queue_timeout=2.0):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self._slots = threading.Condition(threading.Lock())
+        self._active = 0
+        self._waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed = {}
+
+    def _shed(self, reason, retry_after, status=503):
+        with self._lock:
+            self.shed[reason] = self.shed.get(reason, 0) + 1
+        raise AdmissionRejected(reason, retry_after, status)
+
+    def check_rate(self, client):
+        """Applique les limites de débit par client puis globale (lève AdmissionRejected)."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._clients.get(client)
+            if bucket is None:
+                bucket = self._clients[client] = TokenBucket(self.client_rate, self.client_burst)
+                if len(self._clients) > self.max_clients:
+                    # Mémoire bornée: on oublie le client le moins récemment vu
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client)
+            client_wait = bucket.take(now)
+            global_wait = 0 if client_wait else self.global_bucket.take(now)
+        if client_wait:
+            self._shed('client_rate', client_wait, status=429)
+        if global_wait:
+            self._shed('global_rate', global_wait)
+
+    def acquire_slot(self):
+        """Réserve une place de callback, en attendant brièvement dans la file si besoin."""
+        with self._slots:
+            if self._active < self.max_concurrent:
+                self._active += 1
+                return
+            if self._waiting >= self.max_queue:
+                queue_full = True
+            else:
+                queue_full = False
+                self._waiting += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self._active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._slots.wait(remaining)
+                    admitted = self._active < self.max_concurrent
+                    if admitted:
+                        self._active += 1
+                finally:
+                    self._waiting -= 1
+        if queue_full:
+            self._shed('queue_full', self.queue_timeout)
+        if not admitted:
+            self._shed('queue_timeout', self.queue_timeout)
+        with self._lock:
+            self.queued += 1
+
+    def release_slot(self):
+        with self._slots:
+            self._active -= 1
+            self._slots.notify()
+
+    def admit(self, client, limit_concurrency=False):
+        """Admet une requête; retourne True si une place de callback a été réservée."""
+        self.check_rate(client)
+        if limit_concurrency:
+            self.acquire_slot()
+        with self._lock:
+            self.admitted += 1
+        return limit_concurrency
+
+    def snapshot(self):
+        """Compteurs d'admission pour la supervision."""
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "shed": dict(self.shed),
+                "active_callbacks": self._active,
+                "waiting_callbacks": self._waiting,
+                "tracked_clients": len(self._clients)
+            }
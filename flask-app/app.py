@@ -1,10 +1,21 @@
-from flask import Flask, session, redirect, request, url_for, jsonify
+from flask import Flask, session, redirect, request, url_for, jsonify, g
 import os
+import secrets
 from functools import wraps
+import hashlib
 import requests
 import time
 import json
 from authlib.integrations.flask_client import OAuth
+from authlib.integrations.requests_client import OAuth2Session
+from authlib.jose import JsonWebKey, jwt as jose_jwt
+from werkzeug.middleware.proxy_fix import ProxyFix
+from revocation import RevocationList
+from profiling import ProfilingMiddleware, slowest_profiles
+from structured_logging import setup_logging, logging_snapshot
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from admission import AdmissionController, AdmissionRejected
+from claims_cache import ClaimsCache
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', os.urandom(24))
@@ -15,6 +26,136 @@ OIDC_CLIENT_ID = os.getenv("OIDC_CLIENT_ID", "flask-app")
 OIDC_CLIENT_SECRET = os.getenv("OIDC_CLIENT_SECRET", "flask-app-secret")
 OIDC_REDIRECT_URI = os.getenv("OIDC_REDIRECT_URI", "http://localhost:5000/callback")
 
+# Logs JSON structurés, écrits par un thread en arrière-plan
+logger = setup_logging(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    log_file=os.getenv("LOG_FILE"),
+    queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    error_limit=int(os.getenv("LOG_ERROR_RATE_LIMIT", "10")),
+    error_window=float(os.getenv("LOG_ERROR_RATE_WINDOW", "60"))
+)
+LOGGED_ENDPOINTS = {'login', 'callback', 'logout', 'health', 'backchannel_logout'}
+
+def subject_hash(sub):
+    """Empreinte du sujet pour les logs (le sub n'est jamais journalisé en clair)."""
+    if not sub:
+        return None
+    return hashlib.sha256(sub.encode()).hexdigest()[:16]
+
+# Liste de révocation partagée entre workers (fichier SQLite local, copie en mémoire par worker)
+REVOCATION_DB = os.getenv("REVOCATION_DB", "/tmp/kc_aas_revocations.db")
+REVOCATION_MAX_ENTRIES = int(os.getenv("REVOCATION_MAX_ENTRIES", "100000"))
+REVOCATION_DEFAULT_TTL = int(os.getenv("REVOCATION_DEFAULT_TTL", "86400"))
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", "2"))
+
+# Back-channel logout émis par Keycloak (Dex n'en émet pas): désactivé sans BACKCHANNEL_LOGOUT_ISSUER
+BACKCHANNEL_LOGOUT_ISSUER = os.getenv("BACKCHANNEL_LOGOUT_ISSUER")
+BACKCHANNEL_LOGOUT_AUDIENCE = os.getenv("BACKCHANNEL_LOGOUT_AUDIENCE", "dex")
+BACKCHANNEL_LOGOUT_EVENT = "http://schemas.openid.net/event/backchannel-logout"
+KEYCLOAK_TIMEOUT = float(os.getenv("KEYCLOAK_TIMEOUT", "5"))
+
+revocations = RevocationList(
+    REVOCATION_DB,
+    max_entries=REVOCATION_MAX_ENTRIES,
+    default_ttl=REVOCATION_DEFAULT_TTL,
+    sync_interval=REVOCATION_SYNC_INTERVAL
+).start()
+
+# Disjoncteur autour des appels vers Dex (discovery, token, JWKS)
+DEX_TIMEOUT = float(os.getenv("DEX_TIMEOUT", "5"))
+dex_breaker = CircuitBreaker(
+    'dex',
+    failure_rate_threshold=float(os.getenv("DEX_CB_FAILURE_RATE", "0.5")),
+    min_calls=int(os.getenv("DEX_CB_MIN_CALLS", "10")),
+    window=float(os.getenv("DEX_CB_WINDOW", "30")),
+    slow_call_ms=float(os.getenv("DEX_CB_SLOW_CALL_MS", "2000")),
+    open_duration=float(os.getenv("DEX_CB_OPEN_DURATION", "30")),
+    half_open_max_calls=int(os.getenv("DEX_CB_HALF_OPEN_CALLS", "1"))
+)
+
+def is_server_error(response):
+    return response.status_code >= 500
+
+class DexOAuth2Session(OAuth2Session):
+    """Session OAuth2 dont toutes les requêtes vers Dex passent par le disjoncteur."""
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', DEX_TIMEOUT)
+        return dex_breaker.call(super().request, method, url, *args, is_failure=is_server_error, **kwargs)
+
+# Contrôle d'admission sur /login et /callback (limites de débit et callbacks simultanés)
+admission = AdmissionController(
+    global_rate=float(os.getenv("ADMISSION_GLOBAL_RATE", "50")),
+    global_burst=float(os.getenv("ADMISSION_GLOBAL_BURST", "100")),
+    client_rate=float(os.getenv("ADMISSION_CLIENT_RATE", "1")),
+    client_burst=float(os.getenv("ADMISSION_CLIENT_BURST", "10")),
+    max_clients=int(os.getenv("ADMISSION_MAX_CLIENTS", "10000")),
+    max_concurrent=int(os.getenv("ADMISSION_MAX_CALLBACKS", "20")),
+    max_queue=int(os.getenv("ADMISSION_CALLBACK_QUEUE", "20")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+)
+
+# Nombre de proxys de confiance devant l'application: sans cela, tous les clients derrière un
+# même proxy partageraient la limite d'une seule IP (X-Forwarded-For est ignoré par défaut)
+ADMISSION_TRUST_X_FORWARDED_FOR = int(os.getenv("ADMISSION_TRUST_X_FORWARDED_FOR", "0"))
+if ADMISSION_TRUST_X_FORWARDED_FOR > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=ADMISSION_TRUST_X_FORWARDED_FOR)
+
+def admission_required(limit_concurrency=False):
+    """Décorateur d'admission: limite de débit par IP (un seau par route) et globale, et
+    optionnellement nombre borné de requêtes simultanées (callbacks)."""
+    def decorator(fn):
+        @wraps(fn)
+        def decorated_view(*args, **kwargs):
+            client = f"{request.endpoint}:{request.remote_addr or 'unknown'}"
+            holds_slot = admission.admit(client, limit_concurrency)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                if holds_slot:
+                    admission.release_slot()
+        return decorated_view
+    return decorator
+
+@app.errorhandler(AdmissionRejected)
+def admission_rejected(e):
+    # Réponse légère de délestage, sans appel à Dex
+    response = app.response_class(
+        "Trop de connexions en cours, réessayez dans quelques secondes.",
+        status=e.status,
+        mimetype='text/plain'
+    )
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+# Cache des claims userinfo par session (LRU + TTL)
+claims_cache = ClaimsCache(
+    max_entries=int(os.getenv("CLAIMS_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("CLAIMS_CACHE_TTL", "300"))
+)
+PROFILE_CLAIMS = ('sub', 'name', 'email', 'username', 'groups', 'roles')
+
+def claims_cache_key(user):
+    """Clé de cache d'une session: son identifiant local."""
+    return user.get('session_id')
+
+def fetch_profile_claims(user):
+    """Claims compacts de la session, enrichis par l'endpoint userinfo de Dex.
+
+    Retourne (claims, enrichis); si Dex est indisponible, les claims de la session sont renvoyés.
+    """
+    claims = {key: user.get(key) for key in PROFILE_CLAIMS}
+    try:
+        userinfo = dex.userinfo(token=user['token'])
+    except Exception:
+        return claims, False
+    claims['name'] = userinfo.get('name', claims['name'])
+    claims['email'] = userinfo.get('email', claims['email'])
+    claims['username'] = userinfo.get('preferred_username', claims['username'])
+    if 'groups' in userinfo:
+        claims['groups'] = sorted(set(userinfo.get('groups') or []))
+    return claims, True
+
 # Setup OAuth
 oauth = OAuth(app)
 
@@ -25,20 +166,151 @@ dex = oauth.register(
     client_id=OIDC_CLIENT_ID,
     client_secret=OIDC_CLIENT_SECRET,
     client_kwargs={
-        'scope': 'openid email profile',
+        # federated:id expose le sujet Keycloak, utilisé par le back-channel logout
+        'scope': 'openid email profile groups federated:id',
         'token_endpoint_auth_method': 'client_secret_basic'
     }
 )
+dex.client_cls = DexOAuth2Session
+
+@app.errorhandler(CircuitOpenError)
+def circuit_open(e):
+    # Réponse immédiate tant que Dex est considéré indisponible
+    g.auth_error = str(e)
+    response = jsonify({"error": "temporarily_unavailable", "error_description": str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def current_user():
+    """Retourne l'utilisateur de la session, ou None si la session est révoquée ou expirée."""
+    user = session.get('user')
+    if not user:
+        return None
+    # Une session sans identifiant local ne pourrait pas être révoquée: elle est refusée
+    expired = not user.get('session_id') or (user.get('exp') and user['exp'] <= time.time())
+    if expired or revocations.is_revoked(
+        issued_at=user.get('iat', 0),
+        session=user.get('session_id'),
+        subject=user.get('upstream_sub')
+    ):
+        session.pop('user', None)
+        return None
+    return user
 
 # La fonctionnalité de décorateur pour sécuriser les routes
 def login_required(fn):
     @wraps(fn)
     def decorated_view(*args, **kwargs):
-        if session.get('user'):
+        if current_user():
             return fn(*args, **kwargs)
         return redirect('/login')
     return decorated_view
 
+# Registre des permissions (groupes et rôles) connues des routes: chaque nom reçoit un bit
+PERMISSION_BITS = {}
+_permissions_version = None
+
+def permission_bit(kind, name):
+    """Retourne le bit associé à une permission, en l'allouant si nécessaire."""
+    global _permissions_version
+    key = f"{kind}:{name}"
+    if key not in PERMISSION_BITS:
+        PERMISSION_BITS[key] = 1 << len(PERMISSION_BITS)
+        _permissions_version = None
+    return PERMISSION_BITS[key]
+
+def permissions_version():
+    """Empreinte du registre, pour détecter les masques de session calculés avec un autre registre."""
+    global _permissions_version
+    if _permissions_version is None:
+        _permissions_version = hashlib.sha1(','.join(PERMISSION_BITS).encode()).hexdigest()[:12]
+    return _permissions_version
+
+def compute_permission_mask(groups, roles):
+    """Convertit les groupes et rôles d'une session en masque de bits (permissions inconnues ignorées)."""
+    mask = 0
+    for kind, names in (('group', groups), ('role', roles)):
+        for name in names or ():
+            mask |= PERMISSION_BITS.get(f"{kind}:{name}", 0)
+    return mask
+
+def extract_roles(claims):
+    """Extrait les rôles des claims (claim 'roles' ou 'realm_access.roles' de Keycloak).
+
+    DEX ne relaie aucun de ces claims: derrière DEX, la liste est toujours vide.
+    """
+    roles = set(claims.get('roles') or [])
+    roles.update((claims.get('realm_access') or {}).get('roles') or [])
+    return sorted(roles)
+
+def session_permission_mask(user):
+    """Retourne le masque de permissions de la session, recalculé si le registre a changé."""
+    version = permissions_version()
+    if user.get('permissions_version') != version:
+        user['permissions_mask'] = compute_permission_mask(user.get('groups'), user.get('roles'))
+        user['permissions_version'] = version
+        session.modified = True
+    return user['permissions_mask']
+
+def requires(groups=None, roles=None):
+    """Décorateur d'autorisation: l'utilisateur doit appartenir à au moins un des groupes
+    et posséder au moins un des rôles indiqués.
+
+    La politique est compilée en masques de bits à l'enregistrement de la route, la
+    vérification par requête se limite donc à des opérations binaires.
+    """
+    groups_mask = 0
+    for name in groups or ():
+        groups_mask |= permission_bit('group', name)
+    roles_mask = 0
+    for name in roles or ():
+        roles_mask |= permission_bit('role', name)
+
+    def decorator(fn):
+        @wraps(fn)
+        def decorated_view(*args, **kwargs):
+            user = current_user()
+            if not user:
+                return redirect('/login')
+            mask = session_permission_mask(user)
+            if groups_mask and not mask & groups_mask:
+                return "Accès refusé: groupe requis manquant.", 403
+            if roles_mask and not mask & roles_mask:
+                return "Accès refusé: rôle requis manquant.", 403
+            return fn(*args, **kwargs)
+        return decorated_view
+    return decorator
+
+@app.before_request
+def start_request_timer():
+    if request.endpoint in LOGGED_ENDPOINTS:
+        g.request_start = time.perf_counter()
+        g.subject_hash = subject_hash((session.get('user') or {}).get('sub'))
+
+@app.after_request
+def log_auth_event(response):
+    # Un log JSON par événement du flux d'authentification
+    if request.endpoint not in LOGGED_ENDPOINTS or 'request_start' not in g:
+        return response
+    error = g.get('auth_error')
+    level = 'error' if error or response.status_code >= 500 else 'info'
+    getattr(logger, level)(
+        f"{request.endpoint} {response.status_code}",
+        extra={
+            "event": request.endpoint,
+            "route": request.path,
+            "method": request.method,
+            "status": response.status_code,
+            "latency_ms": round((time.perf_counter() - g.request_start) * 1000, 2),
+            "outcome": "error" if level == 'error' else ("denied" if response.status_code >= 400 else "success"),
+            "subject_hash": g.get('subject_hash'),
+            "client_id": OIDC_CLIENT_ID,
+            "error": error
+        }
+    )
+    return response
+
 @app.route('/')
 @login_required
 def home():
@@ -47,14 +319,32 @@ def home():
 @app.route('/profile')
 @login_required
 def profile():
-    return jsonify(session.get('user'))
+    user = session['user']
+    key = claims_cache_key(user)
+    if request.args.get('refresh'):
+        claims_cache.invalidate(key)
+    claims = claims_cache.get(key)
+    if claims is None:
+        claims, enriched = fetch_profile_claims(user)
+        # Sans userinfo, on ne garde les claims de la session que brièvement avant de réessayer
+        claims_cache.set(key, claims, ttl=None if enriched else min(claims_cache.ttl, 10))
+    
+    # ETag sur les claims: les frontends qui interrogent /profile reçoivent un 304 tant que rien ne change
+    response = jsonify(claims)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 @app.route('/login')
+@admission_required()
 def login():
+    # Inutile de rediriger vers Dex si le circuit est ouvert
+    dex_breaker.check()
     redirect_uri = url_for('callback', _external=True)
     return dex.authorize_redirect(redirect_uri)
 
 @app.route('/callback')
+@admission_required(limit_concurrency=True)
 def callback():
     try:
         # Get the token from Dex
@@ -66,23 +356,89 @@ def callback():
         # Add access token to user info
         user_info['access_token'] = token.get('access_token')
         
+        # Groupes (mappés par Dex via claimMapping) et rôles, compilés une fois en masque de bits
+        groups = sorted(set(user_info.get('groups') or []))
+        roles = extract_roles(user_info)
+        
         # Store user info in session
+        # Les ID tokens de Dex n'ont ni sid ni jti: la session reçoit un identifiant local révocable
         session['user'] = {
+            'session_id': secrets.token_urlsafe(),
             'name': user_info.get('name', 'Utilisateur'),
             'email': user_info.get('email', ''),
             'username': user_info.get('preferred_username', user_info.get('sub', '')),
             'sub': user_info.get('sub'),
+            'groups': groups,
+            'roles': roles,
+            'permissions_mask': compute_permission_mask(groups, roles),
+            'permissions_version': permissions_version(),
+            'upstream_sub': (user_info.get('federated_claims') or {}).get('user_id'),
+            'iat': user_info.get('iat', time.time()),
+            'exp': user_info.get('exp'),
             'token': token
         }
+        claims_cache.invalidate(claims_cache_key(session['user']))
+        g.subject_hash = subject_hash(user_info.get('sub'))
         return redirect('/')
+    except CircuitOpenError:
+        raise
     except Exception as e:
+        g.auth_error = f"{type(e).__name__}: {e}"
         return f"Erreur lors de l'authentification: {str(e)}", 500
 
 @app.route('/logout')
 def logout():
-    session.pop('user', None)
+    user = session.pop('user', None)
+    if user:
+        claims_cache.invalidate(claims_cache_key(user))
+        # Révoquer la session pour que les autres workers et réplicas rejettent le cookie
+        revocations.revoke('session', user.get('session_id'), user.get('exp'))
     return redirect('/')
 
+def fetch_backchannel_jwks():
+    """Clés publiques du realm Keycloak qui signe les logout_token."""
+    metadata = requests.get(
+        f"{BACKCHANNEL_LOGOUT_ISSUER.rstrip('/')}/.well-known/openid-configuration",
+        timeout=KEYCLOAK_TIMEOUT
+    )
+    metadata.raise_for_status()
+    jwks = requests.get(metadata.json()['jwks_uri'], timeout=KEYCLOAK_TIMEOUT)
+    jwks.raise_for_status()
+    return JsonWebKey.import_key_set(jwks.json())
+
+if BACKCHANNEL_LOGOUT_ISSUER:
+    @app.route('/backchannel-logout', methods=['POST'])
+    def backchannel_logout():
+        """Récepteur OIDC Back-Channel Logout de Keycloak: révoque les sessions du sujet Keycloak."""
+        logout_token = request.form.get('logout_token')
+        if not logout_token:
+            return jsonify({"error": "invalid_request"}), 400
+        try:
+            claims = jose_jwt.decode(logout_token, fetch_backchannel_jwks(), claims_options={
+                "iss": {"essential": True, "value": BACKCHANNEL_LOGOUT_ISSUER},
+                "aud": {"essential": True, "value": BACKCHANNEL_LOGOUT_AUDIENCE},
+                "iat": {"essential": True}
+            })
+            claims.validate()
+            if BACKCHANNEL_LOGOUT_EVENT not in (claims.get('events') or {}):
+                raise ValueError("événement back-channel logout absent")
+            if 'nonce' in claims:
+                raise ValueError("un logout_token ne doit pas contenir de nonce")
+            # Le sid Keycloak ne correspond à aucune session Dex: seul le sujet peut être relié
+            if not claims.get('sub'):
+                raise ValueError("sub requis")
+        except Exception as e:
+            g.auth_error = f"{type(e).__name__}: {e}"
+            return jsonify({"error": "invalid_request", "error_description": str(e)}), 400
+        
+        # Toutes les sessions du sujet ouvertes avant ce logout sont révoquées, pendant
+        # REVOCATION_DEFAULT_TTL (la durée de vie des sessions ciblées n'est pas connue)
+        revocations.revoke('subject', claims['sub'])
+        
+        response = jsonify({})
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
 @app.route('/health')
 def health():
     # Vérifier les configurations et connexions
@@ -90,12 +446,18 @@ def health():
         "status": "ok",
         "oidc_discovery_url": OIDC_DISCOVERY_URL,
         "client_id": OIDC_CLIENT_ID,
-        "redirect_uri": OIDC_REDIRECT_URI
+        "redirect_uri": OIDC_REDIRECT_URI,
+        "dex_circuit": dex_breaker.snapshot(),
+        "admission": admission.snapshot(),
+        "claims_cache": claims_cache.snapshot(),
+        "logging": logging_snapshot(logger)
     }
     
     # Vérifier si le discovery endpoint est accessible
     try:
-        discovery_response = requests.get(OIDC_DISCOVERY_URL, timeout=5)
+        discovery_response = dex_breaker.call(
+            requests.get, OIDC_DISCOVERY_URL, timeout=DEX_TIMEOUT, is_failure=is_server_error
+        )
         health_info["discovery_status"] = discovery_response.status_code
         health_info["discovery_accessible"] = True
         
@@ -107,12 +469,44 @@ def health():
                 "userinfo_endpoint": oidc_config.get("userinfo_endpoint"),
                 "jwks_uri": oidc_config.get("jwks_uri")
             }
+    except CircuitOpenError as e:
+        health_info["discovery_status"] = "circuit_open"
+        health_info["discovery_error"] = str(e)
+        health_info["discovery_accessible"] = False
     except Exception as e:
+        g.auth_error = f"{type(e).__name__}: {e}"
         health_info["discovery_status"] = "error"
         health_info["discovery_error"] = str(e)
         health_info["discovery_accessible"] = False
     
     return jsonify(health_info)
 
+# Profilage opt-in des requêtes: aucun middleware n'est installé si PROFILE_ENABLED est désactivé
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/kc_aas_profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_SLOW_THRESHOLD_MS = float(os.getenv("PROFILE_SLOW_THRESHOLD_MS", "0"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+PROFILE_INDEX_TOKEN = os.getenv("PROFILE_INDEX_TOKEN")
+
+if PROFILE_ENABLED:
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app,
+        PROFILE_DIR,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        slow_threshold_ms=PROFILE_SLOW_THRESHOLD_MS,
+        max_files=PROFILE_MAX_FILES
+    )
+
+if PROFILE_ENABLED and PROFILE_INDEX_TOKEN:
+    @app.route('/debug/profiles')
+    def debug_profiles():
+        # Index des requêtes profilées les plus lentes, réservé aux détenteurs du jeton
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not secrets.compare_digest(supplied.encode(), PROFILE_INDEX_TOKEN.encode()):
+            return "Jeton d'accès aux profils invalide.", 401
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify(slowest_profiles(PROFILE_DIR, limit))
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """Levée sans appel réseau lorsque le circuit est ouvert."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit '{name}' ouvert, nouvel essai dans {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Disjoncteur pour les appels sortants (fermé, ouvert, semi-ouvert).
+
+    Sur une fenêtre glissante de `window` secondes, le circuit s'ouvre lorsque au moins
+    `min_calls` appels ont été faits et que la proportion d'échecs (exceptions, réponses
+    5xx ou appels plus lents que `slow_call_ms`) atteint `failure_rate_threshold`. Après
+    `open_duration` secondes, `half_open_max_calls` appels de test sont autorisés: s'ils
+    réussissent le circuit se referme, sinon il se rouvre.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_rate_threshold=0.5, min_calls=10, window=30.0,
+                 slow_call_ms=2000, open_duration=30.0, half_open_max_calls=1):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.slow_call_ms = slow_call_ms
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self._calls = deque()
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def _retry_after(self, now):
+        return max(1, int(self._opened_at + self.open_duration - now + 0.999))
+
+    def check(self):
+        """Lève CircuitOpenError si le circuit est ouvert, sans consommer d'appel de test."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.OPEN and now - self._opened_at < self.open_duration:
+                self._rejected += 1
+                raise CircuitOpenError(self.name, self._retry_after(now))
+
+    def acquire(self):
+        """Autorise un appel ou lève CircuitOpenError (coût constant, sans réseau)."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.OPEN:
+                if now - self._opened_at < self.open_duration:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, self._retry_after(now))
+                self.state = self.HALF_OPEN
+                self._half_open_calls = 0
+                self._half_open_successes = 0
+            if self.state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, 1)
+                self._half_open_calls += 1
+
+    def record(self, success, duration_ms):
+        """Enregistre le résultat d'un appel autorisé par acquire()."""
+        failed = not success or duration_ms >= self.slow_call_ms
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if failed:
+                    self._open(now)
+                else:
+                    self._half_open_successes += 1
+                    if self._half_open_successes >= self.half_open_max_calls:
+                        self.state = self.CLOSED
+                        self._calls.clear()
+                return
+            if self.state == self.OPEN:
+                return
+            self._calls.append((now, failed))
+            while self._calls and now - self._calls[0][0] > self.window:
+                self._calls.popleft()
+            if len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, f in self._calls if f)
+                if failures / len(self._calls) >= self.failure_rate_threshold:
+                    self._open(now)
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self._opened_at = now
+        self._calls.clear()
+
+    def call(self, fn, *args, is_failure=None, **kwargs):
+        """Exécute fn à travers le disjoncteur; is_failure(résultat) classe les réponses en échec."""
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record(False, (time.perf_counter() - start) * 1000)
+            raise
+        failed = is_failure(result) if is_failure else False
+        self.record(not failed, (time.perf_counter() - start) * 1000)
+        return result
+
+    def snapshot(self):
+        """État du disjoncteur pour la supervision."""
+        now = time.monotonic()
+        with self._lock:
+            calls = len(self._calls)
+            failures = sum(1 for _, f in self._calls if f)
+            return {
+                "name": self.name,
+                "state": self.state,
+                "window_calls": calls,
+                "window_failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "rejected_calls": self._rejected,
+                "retry_after": self._retry_after(now) if self.state == self.OPEN else 0
+            }
@@ -0,0 +1,82 @@
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+
+
+class ProfilingMiddleware:
+    """Middleware WSGI qui profile un échantillon de requêtes avec cProfile.
+
+    Les profils sont écrits au format pstats (lisibles par snakeviz, flameprof, gprof2dot...)
+    dans un répertoire à rotation. Avec slow_threshold_ms, seuls les profils des requêtes
+    plus lentes que le seuil sont conservés.
+    """
+
+    def __init__(self, wsgi_app, directory, sample_rate=0.01, slow_threshold_ms=0, max_files=100):
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_threshold_ms = slow_threshold_ms
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, environ, start_response):
+        if random.random() >= self.sample_rate:
+            return self.wsgi_app(environ, start_response)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            profiler.disable()
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= self.slow_threshold_ms:
+                self._dump(profiler, environ, duration_ms)
+
+    def _dump(self, profiler, environ, duration_ms):
+        path = environ.get('PATH_INFO', '/')
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', path).strip('_') or 'root'
+        filename = f"{int(time.time() * 1000)}-{environ.get('REQUEST_METHOD', 'GET')}-{slug}-{duration_ms:.1f}ms.prof"
+        try:
+            profiler.dump_stats(os.path.join(self.directory, filename))
+            self._rotate()
+        except OSError:
+            pass
+
+    def _rotate(self):
+        """Supprime les profils les plus anciens au-delà de max_files."""
+        with self._lock:
+            files = sorted(f for f in os.listdir(self.directory) if f.endswith('.prof'))
+            for filename in files[:max(0, len(files) - self.max_files)]:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+
+PROFILE_FILENAME = re.compile(r'^(?P<timestamp>\d+)-(?P<method>[A-Z]+)-(?P<path>.+)-(?P<duration>[\d.]+)ms\.prof$')
+
+def slowest_profiles(directory, limit=20):
+    """Index des requêtes profilées les plus lentes (partagé entre workers via le répertoire)."""
+    profiles = []
+    try:
+        filenames = os.listdir(directory)
+    except OSError:
+        return profiles
+    for filename in filenames:
+        match = PROFILE_FILENAME.match(filename)
+        if match:
+            profiles.append({
+                "file": os.path.join(directory, filename),
+                "timestamp": int(match.group('timestamp')) / 1000,
+                "method": match.group('method'),
+                "path": match.group('path'),
+                "duration_ms": float(match.group('duration'))
+            })
+    profiles.sort(key=lambda p: p["duration_ms"], reverse=True)
+    return profiles[:limit]
@@ -0,0 +1,178 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+
+
+class BloomFilter:
+    """Filtre de Bloom en mémoire: aucun faux négatif, faux positifs bornés par error_rate."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8 + 1)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    """Liste de révocation (session, sujet) partagée entre workers via un fichier SQLite local.
+
+    Chaque worker garde une copie en mémoire (filtre de Bloom + dictionnaire exact) synchronisée
+    par un thread en arrière-plan: la vérification par requête ne fait ni appel réseau ni accès
+    disque. Les entrées expirent à l'expiration du token révoqué et leur nombre est borné.
+
+    Au-delà de `max_entries`, les entrées évincées restent révoquées: elles sont notées dans un
+    second filtre de Bloom et vérifiées dans SQLite jusqu'à leur expiration (en cas d'erreur
+    SQLite, la valeur est considérée révoquée).
+    """
+
+    KINDS = ('session', 'subject')
+
+    def __init__(self, path, max_entries=100000, default_ttl=86400, sync_interval=2.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.sync_interval = sync_interval
+        self._entries = {}
+        self._bloom = BloomFilter(max_entries)
+        self._spill = BloomFilter(max_entries)
+        self._spilled_until = 0.0
+        self._last_rowid = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS revocations ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, "
+                "revoked_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS revocations_expires_at ON revocations (expires_at)")
+
+    def revoke(self, kind, value, expires_at=None):
+        """Révoque un identifiant de session ou un sujet jusqu'à expires_at (timestamp Unix)."""
+        if kind not in self.KINDS:
+            raise ValueError(f"Type de révocation inconnu: {kind}")
+        if not value:
+            return
+        now = time.time()
+        expires_at = expires_at or now + self.default_ttl
+        if expires_at <= now:
+            return
+        key = f"{kind}:{value}"
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO revocations (key, revoked_at, expires_at) VALUES (?, ?, ?)",
+                (key, now, expires_at)
+            )
+        with self._lock:
+            self._store(key, now, expires_at)
+
+    def is_revoked(self, issued_at=0, **claims):
+        """Indique si l'une des valeurs (session=..., subject=...) a été révoquée après issued_at."""
+        now = time.time()
+        bloom = self._bloom
+        for kind in self.KINDS:
+            value = claims.get(kind)
+            if not value:
+                continue
+            key = f"{kind}:{value}"
+            entry = self._entries.get(key) if key in bloom else None
+            if entry is not None:
+                if entry[1] > now and issued_at <= entry[0]:
+                    return True
+            elif self._spilled_until > now and key in self._spill and self._is_revoked_on_disk(key, issued_at, now):
+                return True
+        return False
+
+    def _is_revoked_on_disk(self, key, issued_at, now):
+        # Entrée possiblement évincée de la mémoire: SQLite fait foi, et on refuse en cas d'erreur
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT revoked_at, expires_at FROM revocations WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return True
+        return bool(row) and row[1] > now and issued_at <= row[0]
+
+    def _store(self, key, revoked_at, expires_at):
+        self._entries[key] = (revoked_at, expires_at)
+        self._bloom.add(key)
+        if len(self._entries) > self.max_entries:
+            # Mémoire bornée: on évince par lots les entrées qui expirent le plus tôt, sans les
+            # oublier (elles seront vérifiées dans SQLite jusqu'à leur expiration)
+            overflow = len(self._entries) - self.max_entries + max(1, self.max_entries // 10)
+            for evicted in sorted(self._entries, key=lambda k: self._entries[k][1])[:overflow]:
+                self._spill.add(evicted)
+                self._spilled_until = max(self._spilled_until, self._entries[evicted][1])
+                del self._entries[evicted]
+            self._rebuild_bloom()
+
+    def _rebuild_bloom(self):
+        bloom = BloomFilter(self.max_entries)
+        for key in self._entries:
+            bloom.add(key)
+        self._bloom = bloom
+
+    def sync(self):
+        """Charge les révocations ajoutées par les autres workers et purge les entrées expirées."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM revocations WHERE expires_at <= ?", (now,))
+            rows = conn.execute(
+                "SELECT id, key, revoked_at, expires_at FROM revocations WHERE id > ? ORDER BY id",
+                (self._last_rowid,)
+            ).fetchall()
+        with self._lock:
+            for row_id, key, revoked_at, expires_at in rows:
+                self._store(key, revoked_at, expires_at)
+                self._last_rowid = max(self._last_rowid, row_id)
+            expired = [key for key, entry in self._entries.items() if entry[1] <= now]
+            if expired:
+                for key in expired:
+                    del self._entries[key]
+                self._rebuild_bloom()
+            if self._spilled_until and self._spilled_until <= now:
+                self._spill = BloomFilter(self.max_entries)
+                self._spilled_until = 0.0
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except sqlite3.Error:
+                pass
+            time.sleep(self.sync_interval)
+
+    def start(self):
+        """Démarre le thread de synchronisation en arrière-plan."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='revocation-sync', daemon=True)
+            self._thread.start()
+        return self
@@ -0,0 +1,141 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import threading
+import time
+
+
+# Champs supplémentaires (passés via extra=...) repris dans les logs JSON
+STRUCTURED_FIELDS = ('event', 'route', 'method', 'status', 'latency_ms', 'outcome',
+                     'subject_hash', 'client_id', 'error', 'suppressed')
+
+
+class JsonFormatter(logging.Formatter):
+    """Formate chaque enregistrement en une ligne JSON."""
+
+    def format(self, record):
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+# Adresses mémoire, identifiants hexadécimaux et nombres qui varient d'une occurrence à l'autre
+VARIABLE_PARTS = re.compile(r'0x[0-9a-fA-F]+|\b[0-9a-fA-F]{8,}\b|\d+')
+
+
+class ErrorRateLimitFilter(logging.Filter):
+    """Limite les erreurs répétées (même événement et même type d'erreur) à `limit` par fenêtre.
+
+    Le type d'erreur est la classe de l'exception (`exc_info`, ou le préfixe "Type: ..." du
+    champ `error`); à défaut, le message dont les parties variables sont masquées. Le nombre
+    d'enregistrements supprimés est reporté dans le champ `suppressed` du premier
+    enregistrement accepté de la fenêtre suivante.
+    """
+
+    def __init__(self, limit=10, window=60.0):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.ERROR:
+            return True
+        key = (getattr(record, 'event', None), self.error_signature(record))
+        now = time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.window:
+                start, count = now, 0
+            if count >= self.limit:
+                self._windows[key] = (start, count, suppressed + 1)
+                return False
+            self._windows[key] = (start, count + 1, 0)
+            if len(self._windows) > 1000:
+                # Éviter une croissance non bornée avec des erreurs toutes différentes
+                self._windows = {k: v for k, v in self._windows.items() if now - v[0] < self.window}
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+    @staticmethod
+    def error_signature(record):
+        if record.exc_info and record.exc_info[0]:
+            return record.exc_info[0].__name__
+        error = getattr(record, 'error', None)
+        if error:
+            error_type, separator, _ = str(error).partition(': ')
+            if separator and error_type.isidentifier():
+                return error_type
+            return VARIABLE_PARTS.sub('#', str(error))
+        return VARIABLE_PARTS.sub('#', str(record.msg))
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui abandonne l'enregistrement si la file est pleine au lieu de bloquer.
+
+    Les enregistrements abandonnés sont comptés dans `dropped` (voir logging_snapshot).
+    """
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(name='kc_aas', level='INFO', log_file=None, queue_size=10000,
+                  error_limit=10, error_window=60.0):
+    """Configure un logger JSON dont l'écriture est faite par un thread en arrière-plan.
+
+    Les workers de requêtes ne font qu'insérer dans une file bornée; le QueueListener écrit
+    sur la sortie standard (et dans log_file si fourni).
+    """
+    formatter = JsonFormatter()
+    handlers = []
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    handlers.append(stream_handler)
+    if log_file:
+        file_handler = logging.handlers.WatchedFileHandler(log_file)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(ErrorRateLimitFilter(error_limit, error_window))
+
+    logger = logging.getLogger(name)
+    logger.setLevel(level.upper())
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return logger
+
+
+def logging_snapshot(logger):
+    """Compteurs de la file de logs pour la supervision (enregistrements en attente et abandonnés)."""
+    for handler in logger.handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            return {"queued": handler.queue.qsize(), "dropped": handler.dropped}
+    return {}
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+import json
+import time
+import sqlite3
+import urllib3
+import requests
+import argparse
+import sys
+from datetime import datetime, timezone
+
+from kc_admin_token import AdminToken
+
+# Désactiver les avertissements liés aux certificats SSL
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+EVENT_TYPES = ["LOGIN", "LOGIN_ERROR", "CODE_TO_TOKEN", "CODE_TO_TOKEN_ERROR", "REFRESH_TOKEN", "REFRESH_TOKEN_ERROR"]
+PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursors (
+    realm TEXT NOT NULL,
+    stream TEXT NOT NULL,
+    last_time INTEGER NOT NULL,
+    last_ids TEXT NOT NULL,
+    PRIMARY KEY (realm, stream)
+);
+CREATE TABLE IF NOT EXISTS counters_minute (
+    realm TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    client TEXT NOT NULL,
+    error TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (realm, bucket, type, client, error)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counters_hour (
+    realm TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    client TEXT NOT NULL,
+    error TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (realm, bucket, type, client, error)
+) WITHOUT ROWID;
+"""
+
+def parse_arguments():
+    """Parse les arguments de ligne de commande."""
+    parser = argparse.ArgumentParser(description="Consommation incrémentale des événements Keycloak et statistiques de connexion")
+
+    # Paramètres de connexion à Keycloak
+    parser.add_argument("--keycloak-url", default="http://localhost:8080", help="URL de Keycloak")
+    parser.add_argument("--admin-user", default="admin", help="Nom d'utilisateur administrateur")
+    parser.add_argument("--admin-password", default="admin", help="Mot de passe administrateur")
+    parser.add_argument("--realm", default="KC_AAS", help="Realm cible")
+    parser.add_argument("--db", default="kc_aas_events.db", help="Fichier SQLite des compteurs et du curseur")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    poll_parser = subparsers.add_parser("poll", help="Récupère les nouveaux événements et met à jour les compteurs")
+    poll_parser.add_argument("--follow", action="store_true", help="Interroge Keycloak en continu")
+    poll_parser.add_argument("--interval", type=float, default=30, help="Intervalle entre deux interrogations (--follow)")
+    poll_parser.add_argument("--retention-days", type=int, default=7,
+                             help="Durée de conservation des compteurs par minute (agrégés par heure au-delà)")
+
+    report_parser = subparsers.add_parser("report", help="Affiche les compteurs agrégés")
+    report_parser.add_argument("--by", default="hour", choices=["minute", "hour", "day"], help="Granularité")
+    report_parser.add_argument("--since-hours", type=float, default=24, help="Période couverte (heures)")
+    report_parser.add_argument("--per-client", action="store_true", help="Détail par client")
+    report_parser.add_argument("--json", action="store_true", help="Sortie JSON")
+
+    return parser.parse_args()
+
+def open_store(db_path):
+    """Ouvre (et initialise si besoin) la base des compteurs."""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def load_cursor(conn, realm_name, stream):
+    row = conn.execute("SELECT last_time, last_ids FROM cursors WHERE realm = ? AND stream = ?",
+                       (realm_name, stream)).fetchone()
+    if not row:
+        return 0, set()
+    return row[0], set(json.loads(row[1]))
+
+def save_cursor(conn, realm_name, stream, last_time, last_ids):
+    conn.execute(
+        "INSERT OR REPLACE INTO cursors (realm, stream, last_time, last_ids) VALUES (?, ?, ?, ?)",
+        (realm_name, stream, last_time, json.dumps(sorted(last_ids)))
+    )
+
+def delete_cursor(conn, realm_name, stream):
+    conn.execute("DELETE FROM cursors WHERE realm = ? AND stream = ?", (realm_name, stream))
+
+def event_key(event):
+    """Identifiant d'un événement (id Keycloak si présent, sinon empreinte de ses champs)."""
+    return event.get("id") or json.dumps(event, sort_keys=True)
+
+def event_day(time_ms, days=0):
+    """Jour UTC (YYYY-MM-DD) d'un horodatage en millisecondes, décalé de `days` jours."""
+    return datetime.fromtimestamp(time_ms / 1000 + days * 86400, tz=timezone.utc).strftime("%Y-%m-%d")
+
+def consume_stream(conn, token, keycloak_url, realm_name, stream, path, params, to_row):
+    """Agrège les événements postérieurs au curseur, page par page; retourne leur nombre.
+
+    Keycloak renvoie les événements du plus récent au plus ancien. Chaque page est agrégée
+    dans la même transaction qu'un curseur bas (plus ancien événement compté) et un curseur
+    haut (plus récent): la mémoire est bornée à une page et, après une erreur, le parcours
+    reprend sous le curseur bas (dateTo) sans recompter. Le curseur principal n'avance qu'à
+    la fin du parcours, lorsque le curseur précédent est atteint.
+    """
+    last_time, last_ids = load_cursor(conn, realm_name, stream)
+    top_time, top_ids = load_cursor(conn, realm_name, f"{stream}:top")
+    low_time, low_ids = load_cursor(conn, realm_name, f"{stream}:low")
+    url = f"{keycloak_url}/admin/realms/{realm_name}/{path}"
+    # Bornes fixées pour tout l'appel: les modifier en cours de route décalerait les pages
+    date_params = []
+    if last_time:
+        date_params.append(("dateFrom", event_day(last_time)))
+    if low_time:
+        date_params.append(("dateTo", event_day(low_time, days=1)))
+    session = requests.Session()
+    counted = 0
+    first = 0
+    while True:
+        page_params = list(params) + date_params + [("first", first), ("max", PAGE_SIZE)]
+        response = session.get(url, params=page_params, headers={"Authorization": f"Bearer {token.get()}"}, verify=False)
+        response.raise_for_status()
+        page = response.json()
+        reached_cursor = False
+        rows = []
+        for event in page:
+            key = event_key(event)
+            if event["time"] < last_time or (event["time"] == last_time and key in last_ids):
+                reached_cursor = True
+                continue
+            # Déjà compté dans ce parcours (pages décalées), ou arrivé après son début
+            if low_time and (event["time"] > low_time or (event["time"] == low_time and key in low_ids)):
+                continue
+            if not top_time:
+                top_time = event["time"]
+            if event["time"] == top_time:
+                top_ids.add(key)
+            if event["time"] == low_time:
+                low_ids.add(key)
+            else:
+                low_time, low_ids = event["time"], {key}
+            rows.append(to_row(event))
+        if rows:
+            with conn:
+                aggregate(conn, realm_name, rows)
+                save_cursor(conn, realm_name, f"{stream}:top", top_time, top_ids)
+                save_cursor(conn, realm_name, f"{stream}:low", low_time, low_ids)
+            counted += len(rows)
+        if reached_cursor or len(page) < PAGE_SIZE:
+            break
+        first += PAGE_SIZE
+
+    with conn:
+        if top_time:
+            save_cursor(conn, realm_name, stream, top_time, top_ids | last_ids if top_time == last_time else top_ids)
+        delete_cursor(conn, realm_name, f"{stream}:top")
+        delete_cursor(conn, realm_name, f"{stream}:low")
+    return counted
+
+def aggregate(conn, realm_name, rows):
+    """Ajoute des (minute, type, client, erreur) aux compteurs par minute."""
+    counts = {}
+    for row in rows:
+        counts[row] = counts.get(row, 0) + 1
+    conn.executemany(
+        "INSERT INTO counters_minute (realm, bucket, type, client, error, count) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (realm, bucket, type, client, error) DO UPDATE SET count = count + excluded.count",
+        [(realm_name,) + key + (count,) for key, count in counts.items()]
+    )
+
+def roll_up(conn, realm_name, retention_days):
+    """Agrège par heure les compteurs par minute plus anciens que la rétention, puis les supprime."""
+    limit = int(time.time() // 60) - retention_days * 24 * 60
+    conn.execute(
+        "INSERT INTO counters_hour (realm, bucket, type, client, error, count) "
+        "SELECT realm, bucket / 60 * 60, type, client, error, SUM(count) FROM counters_minute "
+        "WHERE realm = ? AND bucket < ? GROUP BY realm, bucket / 60 * 60, type, client, error "
+        "ON CONFLICT (realm, bucket, type, client, error) DO UPDATE SET count = count + excluded.count",
+        (realm_name, limit)
+    )
+    conn.execute("DELETE FROM counters_minute WHERE realm = ? AND bucket < ?", (realm_name, limit))
+
+def poll_once(conn, token, keycloak_url, realm_name, retention_days):
+    """Un passage: événements utilisateurs et admin depuis le curseur, agrégés par minute."""
+    events = consume_stream(
+        conn, token, keycloak_url, realm_name, "events", "events", [("type", t) for t in EVENT_TYPES],
+        lambda event: (event["time"] // 60000, event["type"], event.get("clientId") or "", event.get("error") or "")
+    )
+    admin_events = consume_stream(
+        conn, token, keycloak_url, realm_name, "admin-events", "admin-events", [],
+        lambda event: (event["time"] // 60000, f"ADMIN_{event.get('operationType')}_{event.get('resourceType')}",
+                       (event.get("authDetails") or {}).get("clientId") or "", event.get("error") or "")
+    )
+    with conn:
+        roll_up(conn, realm_name, retention_days)
+
+    return events, admin_events
+
+def report(conn, realm_name, by, since_hours, per_client):
+    """Compteurs agrégés par minute, heure ou jour (tables minute et heure réunies)."""
+    size = {"minute": 1, "hour": 60, "day": 1440}[by]
+    since = int(time.time() // 60 - since_hours * 60)
+    client_column = "client" if per_client else "''"
+    rows = conn.execute(
+        f"SELECT bucket / {size} * {size} AS period, type, {client_column}, error, SUM(count) FROM ("
+        "  SELECT bucket, type, client, error, count FROM counters_minute WHERE realm = ? AND bucket >= ?"
+        "  UNION ALL"
+        "  SELECT bucket, type, client, error, count FROM counters_hour WHERE realm = ? AND bucket >= ?"
+        f") GROUP BY period, type, {client_column}, error ORDER BY period, type",
+        (realm_name, since, realm_name, since)
+    ).fetchall()
+    return [
+        {
+            "period": datetime.fromtimestamp(period * 60, tz=timezone.utc).strftime("%Y-%m-%dT%H:%MZ"),
+            "type": event_type,
+            "client": client,
+            "error": error,
+            "count": count
+        }
+        for period, event_type, client, error, count in rows
+    ]
+
+def main():
+    """Fonction principale du script."""
+    args = parse_arguments()
+    conn = open_store(args.db)
+
+    if args.command == "report":
+        rows = report(conn, args.realm, args.by, args.since_hours, args.per_client)
+        if args.json:
+            print(json.dumps(rows, indent=2, ensure_ascii=False))
+        else:
+            print(f"=== ÉVÉNEMENTS DU REALM {args.realm} (par {args.by}) ===")
+            for row in rows:
+                detail = " ".join(part for part in (row["client"], row["error"]) if part)
+                print(f"{row['period']}  {row['type']:<24} {row['count']:>8}  {detail}")
+        return 0
+
+    token = AdminToken(args.keycloak_url, args.admin_user, args.admin_password)
+    while True:
+        try:
+            events, admin_events = poll_once(conn, token, args.keycloak_url, args.realm, args.retention_days)
+            print(f"{datetime.now().strftime('%H:%M:%S')} {events} événement(s) et {admin_events} événement(s) admin agrégés.")
+        except Exception as e:
+            print(f"Erreur lors de la récupération des événements: {e}")
+            if not args.follow:
+                return 1
+        if not args.follow:
+            return 0
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    sys.exit(main())
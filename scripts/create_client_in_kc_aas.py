@@ -49,10 +49,16 @@ def parse_arguments():
                       help="Active les comptes de service")
     parser.add_argument("--enable-authorization", action="store_true", 
                       help="Active l'autorisation (RBAC)")
+    parser.add_argument("--groups-claim", 
+                      help="Ajoute au client le scope 'groups' qui publie les groupes de l'utilisateur dans ce claim")
     parser.add_argument("--no-wait", action="store_true", 
                       help="Ne pas attendre la fin de la création du client")
     parser.add_argument("--quiet", action="store_true", 
                       help="Mode silencieux (affiche seulement le secret du client)")
+    parser.add_argument("--mirror", 
+                      help="Miroir SQLite du realm (voir mirror_realm_in_kc_aas.py) consulté avant Keycloak")
+    parser.add_argument("--mirror-max-age", type=float, default=300, 
+                      help="Âge maximal (s) de la dernière synchronisation du miroir pour qu'il soit consulté")
     
     return parser.parse_args()
 
@@ -78,8 +84,28 @@ def get_admin_token(keycloak_url, admin_user, admin_password, quiet=False):
             print(f"Réponse: {response.text}")
         return None
 
-def create_client(token, keycloak_url, realm_name, client_data, quiet=False):
+def find_client_in_mirror(mirror_db, realm_name, client_id_value, max_age=300):
+    """Cherche le client dans le miroir local; retourne None si absent, sans miroir ou miroir trop ancien."""
+    if not mirror_db or not os.path.exists(mirror_db):
+        return None
+    from mirror_realm_in_kc_aas import open_mirror, mirror_find_client, mirror_is_fresh
+    conn = open_mirror(mirror_db)
+    try:
+        if not mirror_is_fresh(conn, realm_name, max_age):
+            return None
+        return mirror_find_client(conn, realm_name, client_id_value)
+    finally:
+        conn.close()
+
+def create_client(token, keycloak_url, realm_name, client_data, quiet=False, mirror_db=None, mirror_max_age=300):
     """Crée un client dans un realm spécifique."""
+    # Le miroir local (s'il est récent) évite la requête d'existence lorsque le client est déjà connu
+    mirrored_client = find_client_in_mirror(mirror_db, realm_name, client_data['clientId'], mirror_max_age)
+    if mirrored_client:
+        if not quiet:
+            print(f"Le client '{client_data['clientId']}' existe déjà dans le realm '{realm_name}' (miroir).")
+        return mirrored_client['id']
+    
     clients_url = f"{keycloak_url}/admin/realms/{realm_name}/clients"
     headers = {
         "Authorization": f"Bearer {token}",
@@ -180,6 +206,61 @@ def regenerate_client_secret(token, keycloak_url, realm_name, client_id, quiet=F
         print(f"Erreur lors de la régénération du secret du client: {e}")
         return None
 
+def ensure_groups_scope(token, keycloak_url, realm_name, client_id, claim_name="groups", quiet=False):
+    """Rattache au client un scope 'groups' publiant l'appartenance aux groupes.
+    
+    Le scope (créé s'il n'existe pas) porte un mapper 'Group Membership' qui ajoute les noms
+    des groupes de l'utilisateur au claim `claim_name` de l'ID token, de l'access token et
+    de userinfo. Il est rattaché comme scope par défaut du client.
+    """
+    scopes_url = f"{keycloak_url}/admin/realms/{realm_name}/client-scopes"
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+    
+    try:
+        response = requests.get(scopes_url, headers=headers, verify=False)
+        response.raise_for_status()
+        scope_id = next((scope['id'] for scope in response.json() if scope['name'] == "groups"), None)
+        
+        if not scope_id:
+            scope_data = {
+                "name": "groups",
+                "protocol": "openid-connect",
+                "attributes": {"include.in.token.scope": "true"},
+                "protocolMappers": [{
+                    "name": "groups",
+                    "protocol": "openid-connect",
+                    "protocolMapper": "oidc-group-membership-mapper",
+                    "config": {
+                        "claim.name": claim_name,
+                        "full.path": "false",
+                        "id.token.claim": "true",
+                        "access.token.claim": "true",
+                        "userinfo.token.claim": "true"
+                    }
+                }]
+            }
+            response = requests.post(scopes_url, headers=headers, json=scope_data, verify=False)
+            response.raise_for_status()
+            scope_id = response.headers["Location"].rstrip("/").split("/")[-1]
+            if not quiet:
+                print(f"Scope 'groups' créé dans le realm '{realm_name}' (claim '{claim_name}').")
+        
+        response = requests.put(
+            f"{keycloak_url}/admin/realms/{realm_name}/clients/{client_id}/default-client-scopes/{scope_id}",
+            headers=headers,
+            verify=False
+        )
+        response.raise_for_status()
+        if not quiet:
+            print(f"Scope 'groups' rattaché au client.")
+        return True
+    except Exception as e:
+        print(f"Erreur lors de l'ajout du scope 'groups': {e}")
+        return False
+
 def verify_client_exists(token, keycloak_url, realm_name, client_id_value, quiet=False):
     """Vérifie si un client existe dans un realm."""
     clients_url = f"{keycloak_url}/admin/realms/{realm_name}/clients?clientId={client_id_value}"
@@ -267,7 +348,8 @@ def main():
         client_data["secret"] = args.client_secret
     
     # 3. Créer le client dans le realm cible
-    client_uuid = create_client(token, args.keycloak_url, args.realm, client_data, args.quiet)
+    client_uuid = create_client(token, args.keycloak_url, args.realm, client_data, args.quiet, args.mirror,
+                                args.mirror_max_age)
     
     if client_uuid:
         client_secret = None
@@ -279,6 +361,11 @@ def main():
                     print("Génération d'un nouveau secret...")
                 client_secret = regenerate_client_secret(token, args.keycloak_url, args.realm, client_uuid, args.quiet)
         
+        # Publier les groupes dans les tokens (requis pour le claim groups relayé par DEX)
+        if args.groups_claim and not ensure_groups_scope(token, args.keycloak_url, args.realm, client_uuid,
+                                                         args.groups_claim, args.quiet):
+            return 1
+        
         # 5. Vérifier que le client existe bien
         client_exists, _ = verify_client_exists(token, args.keycloak_url, args.realm, args.client_id, args.quiet)
         
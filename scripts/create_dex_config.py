@@ -66,6 +66,11 @@ def parse_arguments():
     # Paramètres de sortie
     parser.add_argument("--file", help="Fichier de sortie pour sauvegarder la configuration YAML (ex: dex/config.yaml)")
     
+    # Paramètres de topologie (scale-out horizontal)
+    parser.add_argument("--replicas", type=int, default=1, help="Nombre de réplicas DEX derrière un load balancer (défaut: 1)")
+    parser.add_argument("--lb-image", default="nginx:1.25-alpine", help="Image Docker du load balancer placé devant les réplicas")
+    parser.add_argument("--compose-file", help="Fichier docker compose généré pour la topologie (défaut: <répertoire de --file>/docker-compose.dex.yml)")
+    
     return parser.parse_args()
 
 def generate_random_secret(length=32):
@@ -97,7 +102,8 @@ def get_keycloak_registration_command(args, client_secret):
         f"--keycloak-url \"{args.keycloak_url}\"",
         f"--admin-user \"{args.keycloak_admin_user}\"",
         f"--admin-password \"{args.keycloak_admin_password}\"",
-        f"--realm \"{args.keycloak_realm}\""
+        f"--realm \"{args.keycloak_realm}\"",
+        f"--groups-claim \"{args.claim_groups}\""
     ]
     
     # Si un secret est fourni, utiliser l'option --quiet pour juste afficher le nouveau secret
@@ -149,6 +155,9 @@ def generate_dex_config(args, client_secret):
                 "clientSecret": client_secret,
                 "redirectURI": f"{dex_issuer}/callback",
                 "insecureSkipVerify": True,
+                # Sans ces deux options, DEX ne demande ni ne relaie les groupes de Keycloak
+                "insecureEnableGroups": True,
+                "scopes": ["openid", "profile", "email", "groups"],
                 "claimMapping": {
                     "groups": args.claim_groups,
                     "username": args.claim_username,
@@ -190,15 +199,246 @@ def generate_dex_config(args, client_secret):
         except json.JSONDecodeError:
             print("⚠️ Erreur: La configuration de stockage fournie n'est pas un JSON valide.")
     
-    # Configuration supplémentaire pour des types de stockage spécifiques
-    if args.storage_type == "sqlite3" and "file" not in config["storage"]:
-        config["storage"]["file"] = f"/etc/dex/{args.dex_name}.db"
+    # Configuration supplémentaire pour des types de stockage spécifiques (DEX ne lit que storage.config)
+    if args.storage_type == "sqlite3" and "file" not in config["storage"].get("config", {}):
+        config["storage"].setdefault("config", {})["file"] = f"/etc/dex/{args.dex_name}.db"
     
     return config
 
+def get_replica_name(args, index):
+    """Retourne le nom du conteneur d'un réplica DEX."""
+    return f"{args.dex_name}-{index}"
+
+def get_replica_config_path(args, index):
+    """Retourne le chemin du fichier de configuration d'un réplica (ex: dex/config-1.yaml)."""
+    base, ext = os.path.splitext(args.file)
+    return f"{base}-{index}{ext or '.yaml'}"
+
+def generate_replica_config(args, client_secret):
+    """Génère la configuration commune à tous les réplicas, sur le même stockage partagé."""
+    # Le secret du client statique doit être identique sur tous les réplicas
+    if args.static_client_id and not args.static_client_secret:
+        args.static_client_secret = generate_random_secret()
+    
+    config = generate_dex_config(args, client_secret)
+    # Avec sqlite3, la base doit être sur un volume partagé et non dans /etc/dex
+    storage_config = config["storage"].get("config", {})
+    if args.storage_type == "sqlite3" and storage_config.get("file") == f"/etc/dex/{args.dex_name}.db":
+        storage_config["file"] = f"/var/dex/{args.dex_name}.db"
+    return config
+
+def load_existing_replica_configs(args):
+    """Charge les configurations de réplicas déjà présentes sur le disque (index -> configuration)."""
+    base, ext = os.path.splitext(args.file)
+    directory = os.path.dirname(base) or "."
+    prefix = os.path.basename(base) + "-"
+    existing = {}
+    if not os.path.isdir(directory):
+        return existing
+    for filename in os.listdir(directory):
+        name, file_ext = os.path.splitext(filename)
+        if not name.startswith(prefix) or file_ext != (ext or ".yaml") or not name[len(prefix):].isdigit():
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                existing[int(name[len(prefix):])] = yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError) as e:
+            print(f"⚠️ Impossible de lire {filename}: {e}")
+    return existing
+
+def validate_replica_config(args, config, existing):
+    """Vérifie que la configuration peut être partagée par plusieurs réplicas.
+    
+    Contrôle le stockage (type et contenu de --storage-config) et les configurations de
+    réplicas déjà présentes sur le disque. Retourne (erreurs, avertissements).
+    """
+    errors = []
+    warnings = []
+    storage = config["storage"]
+    backend = storage.get("config") or {}
+    
+    if storage["type"] == "memory":
+        errors.append("Le stockage 'memory' ne peut pas être partagé entre réplicas (utilisez sqlite3 ou postgres).")
+    elif storage["type"] == "mysql":
+        errors.append("Le stockage 'mysql' n'est pas supporté en mode topologie (utilisez sqlite3 ou postgres).")
+    
+    if args.storage_config:
+        try:
+            json.loads(args.storage_config)
+        except json.JSONDecodeError:
+            errors.append("--storage-config n'est pas un JSON valide: les réplicas n'auraient pas de stockage commun.")
+    
+    # DEX ignore les paramètres placés à côté de 'type': ils doivent être sous 'config'
+    misplaced = sorted(key for key in storage if key not in ("type", "config"))
+    if misplaced:
+        errors.append(f"Paramètres de stockage ignorés par DEX: {', '.join(misplaced)} "
+                      "(à placer sous \"config\" dans --storage-config).")
+    
+    if storage["type"] == "postgres":
+        for key in ("host", "database"):
+            if not backend.get(key):
+                errors.append(f"Le stockage postgres doit préciser 'config.{key}' dans --storage-config.")
+        if backend.get("host") in ("localhost", "127.0.0.1", "::1"):
+            errors.append(f"L'hôte postgres '{backend['host']}' désigne le conteneur de chaque réplica, pas une base partagée.")
+    elif storage["type"] == "sqlite3" and not str(backend.get("file", "")).startswith("/var/dex/"):
+        errors.append(f"La base sqlite3 '{backend.get('file')}' n'est pas sur le volume partagé /var/dex: "
+                      "chaque réplica aurait sa propre base.")
+    
+    for index in sorted(existing):
+        previous = existing[index]
+        diverging = [key for key in ("issuer", "storage") if previous.get(key) != config.get(key)]
+        if index > args.replicas:
+            errors.append(f"{get_replica_config_path(args, index)} (réplica {index}) est hors de la topologie demandée: "
+                          "supprimez-le ou augmentez --replicas.")
+        elif diverging:
+            warnings.append(f"{get_replica_config_path(args, index)} sera remplacé et change de "
+                            f"{', '.join(diverging)}: les données de l'ancien stockage ne sont pas migrées.")
+    return errors, warnings
+
+def generate_lb_config(args, replica_names):
+    """Génère la configuration nginx du load balancer placé devant les réplicas."""
+    upstream = "\n".join(f"        server {name}:{args.dex_port};" for name in replica_names)
+    
+    # En TLS, DEX termine lui-même la connexion: le load balancer fait du passthrough TCP
+    if args.dex_tls_cert and args.dex_tls_key:
+        return (
+            "events {}\n"
+            "stream {\n"
+            "    upstream dex {\n"
+            f"{upstream}\n"
+            "    }\n"
+            "    server {\n"
+            f"        listen {args.dex_port};\n"
+            "        proxy_pass dex;\n"
+            "    }\n"
+            "}\n"
+        )
+    
+    return (
+        "events {}\n"
+        "http {\n"
+        "    upstream dex {\n"
+        f"{upstream}\n"
+        "        keepalive 32;\n"
+        "    }\n"
+        "    server {\n"
+        f"        listen {args.dex_port};\n"
+        "        location / {\n"
+        "            proxy_pass http://dex;\n"
+        "            proxy_http_version 1.1;\n"
+        "            proxy_set_header Connection \"\";\n"
+        "            proxy_set_header Host $http_host;\n"
+        "            proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;\n"
+        "            proxy_set_header X-Forwarded-Proto $scheme;\n"
+        "        }\n"
+        "    }\n"
+        "}\n"
+    )
+
+def generate_topology_compose(args, config_paths, lb_config_path, discovery_url):
+    """Génère le fichier docker compose des réplicas DEX, du load balancer et de l'override flask-app."""
+    docker_network = args.docker_network
+    services = {}
+    replica_names = []
+    
+    for index, config_path in enumerate(config_paths, start=1):
+        name = get_replica_name(args, index)
+        replica_names.append(name)
+        volumes = [f"{os.path.abspath(config_path)}:/etc/dex/config.yaml"]
+        if args.storage_type == "sqlite3":
+            volumes.append("dex-data:/var/dex")
+        if args.dex_tls_cert and args.dex_tls_key:
+            volumes.append(f"{os.path.abspath(args.dex_tls_cert)}:{args.dex_tls_cert}")
+            volumes.append(f"{os.path.abspath(args.dex_tls_key)}:{args.dex_tls_key}")
+        services[name] = {
+            "image": "ghcr.io/dexidp/dex:v2.37.0",
+            "command": ["dex", "serve", "/etc/dex/config.yaml"],
+            "volumes": volumes,
+            "networks": [docker_network],
+            "restart": "unless-stopped"
+        }
+    
+    # Le load balancer reprend le nom du broker pour que l'issuer (ex: http://dex:5556) pointe sur lui
+    services[args.dex_name] = {
+        "image": args.lb_image,
+        "ports": [f"{args.dex_port}:{args.dex_port}"],
+        "volumes": [f"{os.path.abspath(lb_config_path)}:/etc/nginx/nginx.conf:ro"],
+        "depends_on": replica_names,
+        "networks": [docker_network]
+    }
+    
+    # Override de l'application Flask pour utiliser le load balancer
+    services["flask-app"] = {
+        "environment": [f"OIDC_DISCOVERY_URL={discovery_url}"],
+        "depends_on": [args.dex_name]
+    }
+    
+    compose = {
+        "services": services,
+        "networks": {
+            docker_network: {
+                "name": docker_network
+            }
+        }
+    }
+    if args.storage_type == "sqlite3":
+        compose["volumes"] = {"dex-data": {}}
+    return compose
+
+def write_topology(args, client_secret):
+    """Écrit les configurations des réplicas, du load balancer et le fichier compose."""
+    config = generate_replica_config(args, client_secret)
+    errors, warnings = validate_replica_config(args, config, load_existing_replica_configs(args))
+    for warning in warnings:
+        print(f"⚠️ {warning}")
+    if errors:
+        for error in errors:
+            print(f"❌ {error}")
+        return 1
+    
+    output_dir = os.path.dirname(args.file)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"# Répertoire créé: {output_dir}")
+    
+    config_paths = []
+    for index in range(1, args.replicas + 1):
+        config_path = get_replica_config_path(args, index)
+        with open(config_path, 'w') as f:
+            yaml.dump(config, f, default_flow_style=False)
+        config_paths.append(config_path)
+        print(f"# Configuration du réplica {index} sauvegardée dans: {config_path}")
+    
+    replica_names = [get_replica_name(args, index) for index in range(1, args.replicas + 1)]
+    lb_config_path = os.path.join(output_dir, "nginx.conf")
+    with open(lb_config_path, 'w') as f:
+        f.write(generate_lb_config(args, replica_names))
+    print(f"# Configuration du load balancer sauvegardée dans: {lb_config_path}")
+    
+    discovery_url = f"{config['issuer'].rstrip('/')}/.well-known/openid-configuration"
+    compose = generate_topology_compose(args, config_paths, lb_config_path, discovery_url)
+    compose_file = args.compose_file or os.path.join(output_dir, "docker-compose.dex.yml")
+    with open(compose_file, 'w') as f:
+        yaml.dump(compose, f, default_flow_style=False, sort_keys=False)
+    print(f"# Fichier compose de la topologie sauvegardé dans: {compose_file}")
+    
+    print(f"\n# Pour démarrer {args.replicas} réplicas DEX derrière le load balancer '{args.dex_name}':")
+    print(f"docker compose -f docker-compose.yml -f {compose_file} up -d")
+    print(f"\n# L'application Flask utilisera: OIDC_DISCOVERY_URL={discovery_url}")
+    if args.storage_type == "postgres":
+        print("# Assurez-vous que la base postgres indiquée dans --storage-config est joignable depuis le réseau Docker.")
+    return 0
+
 def main():
     args = parse_arguments()
     
+    if args.replicas < 1:
+        print("❌ Le nombre de réplicas doit être supérieur ou égal à 1.")
+        return 1
+    if args.replicas > 1 and not args.file:
+        print("❌ L'option --file est requise avec --replicas (ex: --file dex/config.yaml).")
+        return 1
+    
     # Détecter ou utiliser le réseau Docker fourni
     docker_network = args.docker_network # Use directly the provided network
 
@@ -220,6 +460,12 @@ def main():
     
     print("\n=== CONFIGURATION DEX ===")
     
+    # Topologie multi-réplicas: configurations par réplica, load balancer et compose
+    if args.replicas > 1:
+        result = write_topology(args, client_secret)
+        print(f"\n# Note: Le réseau Docker '{docker_network}' sera utilisé pour la communication avec Keycloak.")
+        return result
+    
     # Sauvegarder dans un fichier si spécifié
     if args.file:
         # Créer le répertoire parent si nécessaire
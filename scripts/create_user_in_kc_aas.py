@@ -9,10 +9,30 @@ import requests
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Configuration
-KEYCLOAK_URL = "http://localhost:8080"
+KEYCLOAK_URL = os.getenv("KEYCLOAK_URL", "http://localhost:8080")
 KEYCLOAK_ADMIN_USER = "admin"
 KEYCLOAK_ADMIN_PASSWORD = "admin"
-TARGET_REALM = "KC_AAS"
+TARGET_REALM = os.getenv("KC_AAS_REALM", "KC_AAS")
+# Miroir SQLite du realm (voir mirror_realm_in_kc_aas.py), consulté avant Keycloak s'il existe
+MIRROR_DB = os.getenv("KC_AAS_MIRROR_DB")
+# Au-delà de cet âge (secondes depuis la dernière synchronisation), le miroir est ignoré
+MIRROR_MAX_AGE = float(os.getenv("KC_AAS_MIRROR_MAX_AGE", "300"))
+
+def find_user_in_mirror(realm_name, username):
+    """Cherche l'utilisateur (et ses groupes) dans le miroir local; None si absent, sans miroir ou miroir trop ancien."""
+    if not MIRROR_DB or not os.path.exists(MIRROR_DB):
+        return None
+    from mirror_realm_in_kc_aas import open_mirror, mirror_find_user, mirror_user_groups, mirror_is_fresh
+    conn = open_mirror(MIRROR_DB)
+    try:
+        if not mirror_is_fresh(conn, realm_name, MIRROR_MAX_AGE):
+            return None
+        user = mirror_find_user(conn, realm_name, username)
+        if user:
+            user['groups'] = mirror_user_groups(conn, realm_name, user['id'])
+        return user
+    finally:
+        conn.close()
 
 def get_admin_token():
     """Obtient un token d'accès administrateur pour Keycloak."""
@@ -34,9 +54,14 @@ def get_admin_token():
             print(f"Réponse: {response.text}")
         return None
 
-def create_user(token, realm_name, user_data):
+def create_user(token, realm_name, user_data, keycloak_url=KEYCLOAK_URL):
     """Crée un utilisateur dans un realm spécifique."""
-    users_url = f"{KEYCLOAK_URL}/admin/realms/{realm_name}/users"
+    mirrored_user = find_user_in_mirror(realm_name, user_data['username'])
+    if mirrored_user:
+        print(f"L'utilisateur '{user_data['username']}' existe déjà dans le realm '{realm_name}' (miroir).")
+        return mirrored_user['id']
+    
+    users_url = f"{keycloak_url}/admin/realms/{realm_name}/users"
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
@@ -84,9 +109,9 @@ def create_user(token, realm_name, user_data):
         print(f"Erreur lors de la création de l'utilisateur: {e}")
         return None
 
-def set_user_password(token, realm_name, user_id, password, temporary=False):
+def set_user_password(token, realm_name, user_id, password, temporary=False, keycloak_url=KEYCLOAK_URL):
     """Définit le mot de passe d'un utilisateur."""
-    password_url = f"{KEYCLOAK_URL}/admin/realms/{realm_name}/users/{user_id}/reset-password"
+    password_url = f"{keycloak_url}/admin/realms/{realm_name}/users/{user_id}/reset-password"
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
@@ -112,9 +137,9 @@ def set_user_password(token, realm_name, user_id, password, temporary=False):
         print(f"Erreur lors de la définition du mot de passe: {e}")
         return False
 
-def get_or_create_group(token, realm_name, group_name):
+def get_or_create_group(token, realm_name, group_name, keycloak_url=KEYCLOAK_URL):
     """Récupère ou crée un groupe dans un realm."""
-    groups_url = f"{KEYCLOAK_URL}/admin/realms/{realm_name}/groups"
+    groups_url = f"{keycloak_url}/admin/realms/{realm_name}/groups"
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
@@ -157,14 +182,14 @@ def get_or_create_group(token, realm_name, group_name):
         print(f"Erreur lors de la récupération/création du groupe: {e}")
         return None
 
-def add_user_to_group(token, realm_name, user_id, group_id):
+def add_user_to_group(token, realm_name, user_id, group_id, keycloak_url=KEYCLOAK_URL):
     """Ajoute un utilisateur à un groupe."""
-    group_url = f"{KEYCLOAK_URL}/admin/realms/{realm_name}/users/{user_id}/groups/{group_id}"
+    group_url = f"{keycloak_url}/admin/realms/{realm_name}/users/{user_id}/groups/{group_id}"
     headers = {"Authorization": f"Bearer {token}"}
     
     try:
         # Vérifier si l'utilisateur est déjà dans le groupe
-        groups_url = f"{KEYCLOAK_URL}/admin/realms/{realm_name}/users/{user_id}/groups"
+        groups_url = f"{keycloak_url}/admin/realms/{realm_name}/users/{user_id}/groups"
         response = requests.get(groups_url, headers=headers, verify=False)
         response.raise_for_status()
         
@@ -189,9 +214,21 @@ def add_user_to_group(token, realm_name, user_id, group_id):
         print(f"Erreur lors de l'ajout de l'utilisateur au groupe: {e}")
         return False
 
-def verify_user_exists(token, realm_name, username):
+def verify_user_exists(token, realm_name, username, keycloak_url=KEYCLOAK_URL):
     """Vérifie si un utilisateur existe dans un realm."""
-    users_url = f"{KEYCLOAK_URL}/admin/realms/{realm_name}/users?username={username}"
+    mirrored_user = find_user_in_mirror(realm_name, username)
+    if mirrored_user:
+        print(f"\n=== VÉRIFICATION DE L'UTILISATEUR (MIROIR) ===")
+        print(f"L'utilisateur '{username}' existe dans le realm '{realm_name}':")
+        print(f"ID: {mirrored_user['id']}")
+        if mirrored_user['email']:
+            print(f"Email: {mirrored_user['email']}")
+        print(f"Activé: {mirrored_user['enabled']}")
+        if mirrored_user['groups']:
+            print(f"Groupes: {', '.join(g['name'] for g in mirrored_user['groups'])}")
+        return True
+    
+    users_url = f"{keycloak_url}/admin/realms/{realm_name}/users?username={username}"
     headers = {"Authorization": f"Bearer {token}"}
     
     try:
@@ -211,7 +248,7 @@ def verify_user_exists(token, realm_name, username):
             print(f"Activé: {user['enabled']}")
             
             # Vérifier les groupes
-            groups_url = f"{KEYCLOAK_URL}/admin/realms/{realm_name}/users/{user['id']}/groups"
+            groups_url = f"{keycloak_url}/admin/realms/{realm_name}/users/{user['id']}/groups"
             groups_response = requests.get(groups_url, headers=headers, verify=False)
             
             if groups_response.status_code == 200:
@@ -229,7 +266,7 @@ def verify_user_exists(token, realm_name, username):
         return False
 
 if __name__ == "__main__":
-    print("Création d'un utilisateur dans le realm KC_AAS...")
+    print(f"Création d'un utilisateur dans le realm {TARGET_REALM}...")
     print("Attente de 3 secondes pour s'assurer que Keycloak est prêt...")
     time.sleep(3)
     
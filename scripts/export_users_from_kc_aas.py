@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+import gzip
+import json
+import os
+import time
+import urllib3
+import requests
+import argparse
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from kc_admin_token import AdminToken
+
+# Désactiver les avertissements liés aux certificats SSL
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Champs de la représentation utilisateur conservés dans l'export (réimportables tels quels)
+USER_FIELDS = ("id", "username", "email", "emailVerified", "firstName", "lastName", "enabled",
+               "createdTimestamp", "attributes", "requiredActions", "federationLink")
+
+def parse_arguments():
+    """Parse les arguments de ligne de commande."""
+    parser = argparse.ArgumentParser(description="Export des utilisateurs d'un realm Keycloak en JSONL compressé (gzip)")
+
+    # Paramètres de connexion à Keycloak
+    parser.add_argument("--keycloak-url", default="http://localhost:8080", help="URL de Keycloak")
+    parser.add_argument("--admin-user", default="admin", help="Nom d'utilisateur administrateur")
+    parser.add_argument("--admin-password", default="admin", help="Mot de passe administrateur")
+    parser.add_argument("--realm", default="KC_AAS", help="Realm cible")
+
+    # Paramètres de l'export
+    parser.add_argument("--output", default="users.jsonl.gz", help="Fichier de sortie JSONL compressé")
+    parser.add_argument("--page-size", type=int, default=500, help="Nombre d'utilisateurs par page (first/max)")
+    parser.add_argument("--workers", type=int, default=8, help="Nombre de pages récupérées en parallèle")
+    parser.add_argument("--with-groups", action="store_true", help="Inclure les groupes de chaque utilisateur")
+    parser.add_argument("--with-credentials", action="store_true",
+                        help="Inclure les métadonnées des credentials (type, date, libellé; jamais les secrets)")
+    parser.add_argument("--detail-workers", type=int, default=16,
+                        help="Nombre de requêtes parallèles pour les groupes et credentials")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="Nouvelles tentatives par requête en cas d'erreur réseau, 429 ou 5xx")
+
+    return parser.parse_args()
+
+class AdminClient:
+    """Client de l'API admin avec une session HTTP par thread.
+
+    Les erreurs transitoires (réseau, 429, 5xx) sont retentées au plus `retries` fois,
+    avec un délai doublé à chaque tentative.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, keycloak_url, realm_name, token, retries=3, backoff=0.5, timeout=30):
+        self.base_url = f"{keycloak_url}/admin/realms/{realm_name}"
+        self.token = token
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self, path, params=None):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        for attempt in range(self.retries + 1):
+            try:
+                response = session.get(
+                    f"{self.base_url}{path}",
+                    params=params,
+                    headers={"Authorization": f"Bearer {self.token.get()}"},
+                    timeout=self.timeout,
+                    verify=False
+                )
+                if response.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response.json()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+
+def export_user(client, user, with_groups, with_credentials):
+    """Construit l'enregistrement exporté d'un utilisateur (groupes et credentials optionnels)."""
+    record = {field: user[field] for field in USER_FIELDS if field in user}
+    if with_groups:
+        record["groups"] = [group["path"] for group in client.get(f"/users/{user['id']}/groups", {"max": 10000})]
+    if with_credentials:
+        record["credentialsMetadata"] = [
+            {key: credential[key] for key in ("id", "type", "userLabel", "createdDate", "priority") if key in credential}
+            for credential in client.get(f"/users/{user['id']}/credentials")
+        ]
+    return record
+
+def fetch_page(client, detail_executor, first, page_size, with_groups, with_credentials):
+    """Récupère une page d'utilisateurs puis, en parallèle, les détails de chacun."""
+    users = client.get("/users", {"first": first, "max": page_size, "briefRepresentation": "false"})
+    if not with_groups and not with_credentials:
+        return [export_user(client, user, False, False) for user in users]
+    futures = [detail_executor.submit(export_user, client, user, with_groups, with_credentials) for user in users]
+    return [future.result() for future in futures]
+
+def write_export(client, path, total, page_size, workers, detail_workers, with_groups, with_credentials):
+    """Écrit les pages d'utilisateurs dans `path`, dans l'ordre; retourne le nombre exporté.
+
+    Si des utilisateurs sont créés ou supprimés pendant l'export, les pages se décalent: un
+    utilisateur déjà écrit peut réapparaître, il n'est alors écrit qu'une fois (dédoublonnage par id).
+    """
+    offsets = iter(range(0, total, page_size))
+    pending = deque()
+    seen_ids = set()
+    exported = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as page_executor, \
+            ThreadPoolExecutor(max_workers=detail_workers) as detail_executor, \
+            gzip.open(path, "wt", encoding="utf-8") as f:
+
+        def submit_next():
+            first = next(offsets, None)
+            if first is not None:
+                pending.append(page_executor.submit(
+                    fetch_page, client, detail_executor, first, page_size, with_groups, with_credentials
+                ))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while pending:
+            records = pending.popleft().result()
+            submit_next()
+            for record in records:
+                if record["id"] in seen_ids:
+                    continue
+                seen_ids.add(record["id"])
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+                exported += 1
+            print(f"\r{exported}/{total} utilisateurs exportés", end="", flush=True)
+
+    return exported
+
+def export_users(client, output, page_size=500, workers=8, detail_workers=16,
+                 with_groups=False, with_credentials=False):
+    """Exporte tous les utilisateurs du realm dans un fichier JSONL gzip.
+
+    Au plus 2 * workers pages sont en mémoire: les pages sont écrites dans l'ordre, dès que
+    la plus ancienne page demandée est disponible. L'export est écrit dans `output`.tmp,
+    renommé en `output` seulement s'il est complet.
+
+    Retourne (exportés, durée, total final): un total final différent du nombre exporté
+    signale que le realm a changé pendant l'export (utilisateurs manqués ou supprimés).
+    """
+    total = client.get("/users/count")
+    start = time.time()
+    tmp_output = output + ".tmp"
+
+    try:
+        exported = write_export(client, tmp_output, total, page_size, workers, detail_workers,
+                                with_groups, with_credentials)
+        final_total = client.get("/users/count")
+    except BaseException:
+        # Pas de fichier tronqué qui passerait pour un export complet
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        raise
+    os.replace(tmp_output, output)
+
+    print()
+    return exported, time.time() - start, final_total
+
+def main():
+    """Fonction principale du script."""
+    args = parse_arguments()
+
+    token = AdminToken(args.keycloak_url, args.admin_user, args.admin_password)
+    try:
+        token.get()
+    except Exception as e:
+        print(f"Erreur lors de l'obtention du token: {e}")
+        print("Impossible d'obtenir un token d'accès. Arrêt du script.")
+        return 1
+
+    client = AdminClient(args.keycloak_url, args.realm, token, retries=args.retries)
+    try:
+        exported, duration, final_total = export_users(
+            client, args.output,
+            page_size=args.page_size,
+            workers=args.workers,
+            detail_workers=args.detail_workers,
+            with_groups=args.with_groups,
+            with_credentials=args.with_credentials
+        )
+    except Exception as e:
+        print(f"\nErreur lors de l'export des utilisateurs: {e}")
+        return 1
+
+    if exported != final_total:
+        # Les pages décalées par des créations ou suppressions ont pu faire manquer des utilisateurs
+        print(f"\n⚠️ {exported} utilisateurs exportés dans '{args.output}' mais le realm '{args.realm}' en compte "
+              f"{final_total}: il a été modifié pendant l'export, qui peut être incomplet. Relancez l'export.")
+        return 2
+
+    print(f"\n✅ {exported} utilisateurs du realm '{args.realm}' exportés dans '{args.output}' en {duration:.1f}s.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
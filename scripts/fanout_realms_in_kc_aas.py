@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+import csv
+import gzip
+import json
+import time
+import fnmatch
+import urllib3
+import requests
+import argparse
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from kc_admin_token import AdminToken
+from create_client_in_kc_aas import create_client, get_client_secret, regenerate_client_secret
+from create_user_in_kc_aas import create_user, set_user_password, get_or_create_group, add_user_to_group
+
+# Désactiver les avertissements liés aux certificats SSL
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+def parse_arguments():
+    """Parse les arguments de ligne de commande."""
+    parser = argparse.ArgumentParser(description="Applique une opération (client ou utilisateurs) à plusieurs realms Keycloak en parallèle")
+
+    # Paramètres de connexion à Keycloak
+    parser.add_argument("--keycloak-url", default="http://localhost:8080", help="URL de Keycloak")
+    parser.add_argument("--admin-user", default="admin", help="Nom d'utilisateur administrateur")
+    parser.add_argument("--admin-password", default="admin", help="Mot de passe administrateur")
+
+    # Sélection des realms
+    parser.add_argument("--realms", nargs="+", help="Liste explicite de realms (motifs glob acceptés, ex: tenant-*)")
+    parser.add_argument("--all-realms", action="store_true", help="Tous les realms (via /admin/realms), hors master")
+    parser.add_argument("--exclude", nargs="+", default=[], help="Realms à exclure (motifs glob acceptés)")
+
+    # Concurrence
+    parser.add_argument("--workers", type=int, default=16, help="Nombre maximal d'opérations simultanées au total")
+    parser.add_argument("--per-realm", type=int, default=2, help="Nombre maximal d'opérations simultanées par realm")
+
+    # Sortie
+    parser.add_argument("--summary-json", help="Fichier JSON de synthèse par realm")
+    parser.add_argument("--dry-run", action="store_true", help="Affiche les realms sélectionnés sans rien modifier")
+
+    subparsers = parser.add_subparsers(dest="operation", required=True)
+
+    # Opération: création d'un client (mêmes options que create_client_in_kc_aas.py)
+    client_parser = subparsers.add_parser("create-client", help="Crée (ou retrouve) un client dans chaque realm")
+    client_parser.add_argument("--client-id", required=True, help="ID du client à créer")
+    client_parser.add_argument("--client-name", help="Nom du client (si différent de l'ID)")
+    client_parser.add_argument("--public", action="store_true", help="Définit le client comme public")
+    client_parser.add_argument("--redirect-uris", nargs="+", default=["http://localhost:8000/*"], help="URIs de redirection")
+    client_parser.add_argument("--web-origins", nargs="+", default=["*"], help="Origines web autorisées")
+    client_parser.add_argument("--root-url", help="URL racine du client")
+    client_parser.add_argument("--base-url", help="URL de base du client")
+    client_parser.add_argument("--client-secret", help="Secret du client")
+
+    # Opération: création d'utilisateurs
+    user_parser = subparsers.add_parser("create-users", help="Crée (ou retrouve) des utilisateurs dans chaque realm")
+    users_source = user_parser.add_mutually_exclusive_group(required=True)
+    users_source.add_argument("--users-csv", help="CSV username,password,email[,group]")
+    users_source.add_argument("--users-jsonl",
+                              help="Export JSONL (gzip si .gz) de export_users_from_kc_aas.py, sans mots de passe")
+    user_parser.add_argument("--group", help="Groupe ajouté à tous les utilisateurs (si absent du CSV)")
+
+    return parser.parse_args()
+
+def list_realms(token, keycloak_url):
+    """Liste les noms de tous les realms."""
+    response = requests.get(
+        f"{keycloak_url}/admin/realms",
+        params={"briefRepresentation": "true"},
+        headers={"Authorization": f"Bearer {token}"},
+        verify=False
+    )
+    response.raise_for_status()
+    return [realm["realm"] for realm in response.json()]
+
+def select_realms(args, token):
+    """Résout le sélecteur de realms (liste explicite, glob ou tous les realms)."""
+    patterns = args.realms or []
+    needs_listing = args.all_realms or any(any(c in p for c in "*?[") for p in patterns)
+    if needs_listing:
+        available = list_realms(token, args.keycloak_url)
+    else:
+        available = list(patterns)
+
+    if args.all_realms:
+        selected = [realm for realm in available if realm != "master"]
+    else:
+        selected = []
+        for pattern in patterns:
+            selected.extend(realm for realm in fnmatch.filter(available, pattern) if realm not in selected)
+
+    return [realm for realm in selected if not any(fnmatch.fnmatch(realm, p) for p in args.exclude)]
+
+def load_users(path, default_group=None):
+    """Charge les utilisateurs (username,password,email[,group]) depuis un CSV."""
+    users = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or not row[0] or row[0] == "username":
+                continue
+            group = row[3] if len(row) > 3 and row[3] else default_group
+            users.append({
+                "username": row[0],
+                "password": row[1] if len(row) > 1 else None,
+                "email": row[2] if len(row) > 2 else None,
+                "groups": [group] if group else []
+            })
+    return users
+
+# Champs d'un enregistrement exporté recréés tels quels (l'id, les dates et les credentials ne le sont pas)
+IMPORTED_FIELDS = ("username", "email", "emailVerified", "firstName", "lastName", "enabled",
+                   "attributes", "requiredActions")
+
+def load_users_jsonl(path, default_group=None):
+    """Charge les utilisateurs d'un export JSONL (export_users_from_kc_aas.py).
+
+    Les mots de passe ne sont jamais exportés: les utilisateurs sont recréés sans credentials.
+    Seuls les groupes de premier niveau (ex: /users) sont recréés; les sous-groupes sont ignorés.
+    """
+    users = []
+    skipped_groups = 0
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            groups = []
+            for group_path in record.get("groups") or []:
+                if group_path.count("/") == 1:
+                    groups.append(group_path.lstrip("/"))
+                else:
+                    skipped_groups += 1
+            if default_group and default_group not in groups:
+                groups.append(default_group)
+            users.append({
+                "username": record["username"],
+                "password": None,
+                "email": record.get("email"),
+                "groups": groups,
+                "representation": {field: record[field] for field in IMPORTED_FIELDS if field in record}
+            })
+    if skipped_groups:
+        print(f"⚠️ {skipped_groups} appartenance(s) à des sous-groupes ignorée(s).")
+    return users
+
+def build_client_data(args):
+    """Construit la représentation du client, comme create_client_in_kc_aas.py."""
+    client_data = {
+        "clientId": args.client_id,
+        "name": args.client_name or args.client_id,
+        "enabled": True,
+        "protocol": "openid-connect",
+        "publicClient": args.public,
+        "directAccessGrantsEnabled": True,
+        "standardFlowEnabled": True,
+        "redirectUris": args.redirect_uris,
+        "webOrigins": args.web_origins
+    }
+    if args.root_url:
+        client_data["rootUrl"] = args.root_url
+    if args.base_url:
+        client_data["baseUrl"] = args.base_url
+    if args.client_secret and not args.public:
+        client_data["secret"] = args.client_secret
+    return client_data
+
+def apply_create_client(token, keycloak_url, realm_name, client_data):
+    """Opération create-client pour un realm; lève une exception en cas d'échec."""
+    client_uuid = create_client(token, keycloak_url, realm_name, client_data, quiet=True)
+    if not client_uuid:
+        raise RuntimeError(f"échec de la création du client '{client_data['clientId']}'")
+    if not client_data["publicClient"]:
+        secret = get_client_secret(token, keycloak_url, realm_name, client_uuid, quiet=True)
+        if not secret and not regenerate_client_secret(token, keycloak_url, realm_name, client_uuid, quiet=True):
+            raise RuntimeError("impossible d'obtenir le secret du client")
+
+def apply_resolve_group(token, keycloak_url, realm_name, group_name, group_ids):
+    """Récupère ou crée un groupe d'un realm et note son ID dans group_ids[(realm, groupe)]."""
+    group_id = get_or_create_group(token, realm_name, group_name, keycloak_url=keycloak_url)
+    if not group_id:
+        raise RuntimeError(f"échec de la création du groupe '{group_name}'")
+    group_ids[(realm_name, group_name)] = group_id
+
+def apply_create_user(token, keycloak_url, realm_name, user, group_ids):
+    """Opération create-users pour un utilisateur d'un realm; lève une exception en cas d'échec.
+
+    Les groupes doivent avoir été résolus au préalable (apply_resolve_group): créés en
+    parallèle par plusieurs utilisateurs, ils provoqueraient des conflits 409.
+    """
+    user_data = user.get("representation") or {"username": user["username"], "enabled": True}
+    if user["email"] and "representation" not in user:
+        user_data["email"] = user["email"]
+        user_data["emailVerified"] = True
+    user_id = create_user(token, realm_name, user_data, keycloak_url=keycloak_url)
+    if not user_id:
+        raise RuntimeError(f"échec de la création de l'utilisateur '{user['username']}'")
+    if user["password"] and not set_user_password(token, realm_name, user_id, user["password"], keycloak_url=keycloak_url):
+        raise RuntimeError(f"échec de la définition du mot de passe de '{user['username']}'")
+    for group in user["groups"]:
+        group_id = group_ids.get((realm_name, group))
+        if not group_id or not add_user_to_group(token, realm_name, user_id, group_id, keycloak_url=keycloak_url):
+            raise RuntimeError(f"échec de l'ajout de '{user['username']}' au groupe '{group}'")
+
+def fan_out(realms, tasks_for_realm, run_task, workers=16, per_realm=2):
+    """Exécute les tâches de chaque realm en parallèle.
+
+    Au plus `workers` tâches tournent au total et au plus `per_realm` par realm. Une tâche
+    n'est soumise que si son realm a de la capacité, afin qu'aucun worker ne reste bloqué
+    en attente d'un realm saturé. Retourne la synthèse par realm.
+    """
+    queues = {realm: deque(tasks_for_realm(realm)) for realm in realms}
+    summary = {realm: {"ok": 0, "failed": 0, "errors": [], "duration": 0.0, "_start": None} for realm in realms}
+    in_flight = {realm: 0 for realm in realms}
+    futures = {}
+    rotation = deque(realms)
+
+    def timed(realm, task):
+        start = time.perf_counter()
+        try:
+            run_task(realm, task)
+            return None, time.perf_counter() - start
+        except Exception as e:
+            return str(e), time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # Remplissage en tourniquet pour répartir équitablement la capacité globale
+            idle_rounds = 0
+            while len(futures) < workers and idle_rounds < len(rotation):
+                realm = rotation[0]
+                rotation.rotate(-1)
+                if queues[realm] and in_flight[realm] < per_realm:
+                    task = queues[realm].popleft()
+                    in_flight[realm] += 1
+                    if summary[realm]["_start"] is None:
+                        summary[realm]["_start"] = time.perf_counter()
+                    futures[executor.submit(timed, realm, task)] = realm
+                    idle_rounds = 0
+                else:
+                    idle_rounds += 1
+
+            if not futures:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                realm = futures.pop(future)
+                in_flight[realm] -= 1
+                error, _ = future.result()
+                if error:
+                    summary[realm]["failed"] += 1
+                    summary[realm]["errors"].append(error)
+                else:
+                    summary[realm]["ok"] += 1
+                if not queues[realm] and not in_flight[realm] and summary[realm]["_start"] is not None:
+                    summary[realm]["duration"] = round(time.perf_counter() - summary[realm]["_start"], 3)
+
+    for result in summary.values():
+        del result["_start"]
+    return summary
+
+def main():
+    """Fonction principale du script."""
+    args = parse_arguments()
+
+    token = AdminToken(args.keycloak_url, args.admin_user, args.admin_password)
+    try:
+        realms = select_realms(args, token.get())
+    except Exception as e:
+        print(f"Erreur lors de la sélection des realms: {e}")
+        return 1
+
+    if not realms:
+        print("Aucun realm ne correspond au sélecteur.")
+        return 1
+    print(f"{len(realms)} realm(s) sélectionné(s): {', '.join(realms)}")
+    if args.dry_run:
+        return 0
+
+    group_summary = {}
+    if args.operation == "create-client":
+        client_data = build_client_data(args)
+        tasks_for_realm = lambda realm: [client_data]
+        run_task = lambda realm, data: apply_create_client(token.get(), args.keycloak_url, realm, data)
+    else:
+        if args.users_jsonl:
+            users = load_users_jsonl(args.users_jsonl, args.group)
+        else:
+            users = load_users(args.users_csv, args.group)
+        # Chaque groupe est résolu une seule fois par realm, avant les utilisateurs
+        groups = sorted({group for user in users for group in user["groups"]})
+        group_ids = {}
+        group_summary = fan_out(
+            realms, lambda realm: groups,
+            lambda realm, group: apply_resolve_group(token.get(), args.keycloak_url, realm, group, group_ids),
+            workers=args.workers, per_realm=args.per_realm
+        )
+        tasks_for_realm = lambda realm: users
+        run_task = lambda realm, user: apply_create_user(token.get(), args.keycloak_url, realm, user, group_ids)
+
+    summary = fan_out(realms, tasks_for_realm, run_task, workers=args.workers, per_realm=args.per_realm)
+    for realm, result in group_summary.items():
+        summary[realm]["failed"] += result["failed"]
+        summary[realm]["errors"][:0] = result["errors"]
+        summary[realm]["duration"] = round(summary[realm]["duration"] + result["duration"], 3)
+
+    print("\n=== SYNTHÈSE PAR REALM ===")
+    failed_realms = 0
+    for realm in realms:
+        result = summary[realm]
+        status = "✅" if not result["failed"] else "❌"
+        print(f"{status} {realm}: {result['ok']} ok, {result['failed']} échec(s) en {result['duration']:.1f}s")
+        for error in result["errors"][:3]:
+            print(f"    - {error}")
+        if result["failed"]:
+            failed_realms += 1
+    print(f"\n{len(realms) - failed_realms}/{len(realms)} realm(s) traités sans erreur.")
+
+    if args.summary_json:
+        with open(args.summary_json, 'w') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"Synthèse sauvegardée dans: {args.summary_json}")
+
+    return 1 if failed_realms else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Token administrateur Keycloak partagé par les scripts multi-threads (export, fan-out, événements)."""
+import threading
+import time
+import requests
+
+class AdminToken:
+    """Token administrateur partagé entre threads, renouvelé avant son expiration."""
+
+    def __init__(self, keycloak_url, admin_user, admin_password):
+        self.token_url = f"{keycloak_url}/realms/master/protocol/openid-connect/token"
+        self.admin_user = admin_user
+        self.admin_password = admin_password
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            # Renouvellement 10 secondes avant l'expiration (60s par défaut dans le realm master)
+            if not self._token or time.time() >= self._expires_at - 10:
+                payload = {
+                    "username": self.admin_user,
+                    "password": self.admin_password,
+                    "grant_type": "password",
+                    "client_id": "admin-cli"
+                }
+                response = requests.post(self.token_url, data=payload, verify=False)
+                response.raise_for_status()
+                data = response.json()
+                self._token = data["access_token"]
+                self._expires_at = time.time() + data.get("expires_in", 60)
+            return self._token
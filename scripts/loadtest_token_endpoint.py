@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+import csv
+import json
+import math
+import time
+import random
+import urllib3
+import requests
+import argparse
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Désactiver les avertissements liés aux certificats SSL
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+def parse_arguments():
+    """Parse les arguments de ligne de commande."""
+    parser = argparse.ArgumentParser(description="Générateur de charge pour l'endpoint token de Keycloak ou Dex")
+
+    # Cible
+    parser.add_argument("--token-url", help="URL de l'endpoint token (ex: http://localhost:8080/realms/KC_AAS/protocol/openid-connect/token)")
+    parser.add_argument("--keycloak-url", default="http://localhost:8080", help="URL de Keycloak (si --token-url absent)")
+    parser.add_argument("--realm", default="KC_AAS", help="Realm cible (si --token-url absent)")
+    parser.add_argument("--client-id", required=True, help="ID du client")
+    parser.add_argument("--client-secret", help="Secret du client (clients confidentiels)")
+    parser.add_argument("--scope", default="openid", help="Scope demandé")
+
+    # Charge
+    parser.add_argument("--grant", default="password", choices=["password", "client_credentials", "refresh_token"],
+                        help="Type de grant utilisé")
+    parser.add_argument("--users-csv", help="Fichier CSV (username,password) des utilisateurs (grants password et refresh_token)")
+    parser.add_argument("--rate", type=float, help="Débit cible en requêtes/s (boucle ouverte)")
+    parser.add_argument("--concurrency", type=int, default=10,
+                        help="Nombre de requêtes simultanées (boucle fermée, ou plafond en boucle ouverte)")
+    parser.add_argument("--duration", type=float, default=30, help="Durée du test en secondes")
+    parser.add_argument("--report-interval", type=float, default=5, help="Intervalle des rapports intermédiaires en secondes")
+    parser.add_argument("--timeout", type=float, default=10, help="Timeout HTTP en secondes")
+
+    # Endpoint local de substitution (tests hors ligne)
+    parser.add_argument("--stub", action="store_true", help="Démarre un endpoint token local de substitution et le cible")
+    parser.add_argument("--stub-port", type=int, default=8099, help="Port de l'endpoint de substitution")
+    parser.add_argument("--stub-latency-ms", type=float, default=5, help="Latence simulée par l'endpoint de substitution")
+    parser.add_argument("--stub-error-rate", type=float, default=0, help="Proportion d'erreurs 503 renvoyées par le substitut")
+
+    return parser.parse_args()
+
+class LatencyHistogram:
+    """Histogramme à dynamique élevée (style HdrHistogram) en microsecondes.
+
+    Les valeurs sont rangées dans des buckets log-linéaires: précision relative constante
+    (2^-sub_bucket_bits) de la microseconde à plusieurs minutes, mémoire fixe.
+    """
+
+    def __init__(self, sub_bucket_bits=7, max_value_us=3600 * 1000 * 1000):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        max_shift = max(0, max_value_us.bit_length() - sub_bucket_bits - 1)
+        self.counts = [0] * ((max_shift + 2) * self.sub_bucket_count)
+        self.total = 0
+        self.max = 0
+        self.min = None
+
+    def _index(self, value):
+        # Valeurs < 2 * sub_bucket_count: exactes; au-delà, sub_bucket_count buckets par puissance de 2
+        if value < 2 * self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits - 1
+        top = value >> shift
+        return (shift + 1) * self.sub_bucket_count + (top - self.sub_bucket_count)
+
+    def _value_at(self, index):
+        if index < 2 * self.sub_bucket_count:
+            return index
+        shift = index // self.sub_bucket_count - 1
+        top = index % self.sub_bucket_count + self.sub_bucket_count
+        # Borne haute du bucket: aucune valeur enregistrée n'y dépasse ce qui est reporté
+        return ((top + 1) << shift) - 1
+
+    def record(self, value_us):
+        value = max(0, int(value_us))
+        index = min(self._index(value), len(self.counts) - 1)
+        self.counts[index] += 1
+        self.total += 1
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, percent):
+        if not self.total:
+            return 0
+        target = max(1, math.ceil(self.total * percent / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._value_at(index), self.max)
+        return self.max
+
+class LoadStats:
+    """Statistiques d'une fenêtre (et du total) protégées par un verrou."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.interval = LatencyHistogram()
+        self.interval_errors = Counter()
+        self.total = LatencyHistogram()
+        self.total_errors = Counter()
+
+    def record(self, latency_us, error=None):
+        with self._lock:
+            if error:
+                self.interval_errors[error] += 1
+            else:
+                self.interval.record(latency_us)
+
+    def rotate(self):
+        """Retourne l'histogramme et les erreurs de la fenêtre écoulée et en démarre une nouvelle."""
+        with self._lock:
+            interval, errors = self.interval, self.interval_errors
+            self.interval, self.interval_errors = LatencyHistogram(), Counter()
+        self.total.merge(interval)
+        self.total_errors.update(errors)
+        return interval, errors
+
+def load_users(path):
+    """Charge le pool d'utilisateurs (username,password) depuis un CSV."""
+    users = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and row[0] and row[0] != "username":
+                users.append({"username": row[0], "password": row[1], "refresh_token": None})
+    return users
+
+class TokenClient:
+    """Construit et envoie les requêtes token selon le grant choisi."""
+
+    def __init__(self, args, token_url, users):
+        self.args = args
+        self.token_url = token_url
+        self.users = users
+        self._local = threading.local()
+        self._user_lock = threading.Lock()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _post(self, payload):
+        if self.args.client_secret:
+            auth = (self.args.client_id, self.args.client_secret)
+        else:
+            auth = None
+            payload["client_id"] = self.args.client_id
+        return self._session().post(self.token_url, data=payload, auth=auth, timeout=self.args.timeout, verify=False)
+
+    def _password_payload(self, user):
+        return {"grant_type": "password", "username": user["username"], "password": user["password"], "scope": self.args.scope}
+
+    def issue(self):
+        """Émet une requête token; retourne None en cas de succès ou le libellé de l'erreur."""
+        grant = self.args.grant
+        if grant == "client_credentials":
+            payload = {"grant_type": "client_credentials", "scope": self.args.scope}
+        else:
+            user = random.choice(self.users)
+            if grant == "refresh_token" and user["refresh_token"]:
+                payload = {"grant_type": "refresh_token", "refresh_token": user["refresh_token"]}
+            else:
+                # Premier passage pour cet utilisateur: obtention d'un refresh token via password
+                payload = self._password_payload(user)
+        response = self._post(payload)
+        if response.status_code != 200:
+            if grant == "refresh_token":
+                # Refresh token expiré ou révoqué: le prochain passage refera un grant password
+                with self._user_lock:
+                    user["refresh_token"] = None
+            try:
+                error = response.json().get("error", "")
+            except ValueError:
+                error = ""
+            return f"HTTP {response.status_code} {error}".strip()
+        if grant == "refresh_token":
+            refresh_token = response.json().get("refresh_token")
+            with self._user_lock:
+                user["refresh_token"] = refresh_token
+        return None
+
+def timed_issue(client, stats, scheduled_at):
+    """Exécute une requête et enregistre la latence mesurée depuis l'instant prévu.
+
+    En boucle ouverte, partir de l'instant prévu (et non de l'envoi effectif) évite
+    l'omission coordonnée: l'attente due à la saturation est comptée dans la latence.
+    """
+    error = None
+    try:
+        error = client.issue()
+    except requests.RequestException as e:
+        error = type(e).__name__
+    stats.record((time.perf_counter() - scheduled_at) * 1e6, error)
+
+def format_report(label, elapsed, histogram, errors):
+    """Formate une ligne de rapport (débit, erreurs, percentiles en ms)."""
+    ok = histogram.total
+    failed = sum(errors.values())
+    throughput = (ok + failed) / elapsed if elapsed > 0 else 0
+    percentiles = " ".join(
+        f"p{p:g}={histogram.percentile(p) / 1000:.1f}" for p in (50, 90, 99, 99.9)
+    )
+    line = (f"{label} {throughput:8.1f} req/s  ok={ok} erreurs={failed}  "
+            f"{percentiles} max={histogram.max / 1000:.1f} ms")
+    if errors:
+        line += "  [" + ", ".join(f"{error}: {count}" for error, count in errors.most_common()) + "]"
+    return line
+
+def run_open_loop(client, stats, rate, duration, concurrency):
+    """Envoie les requêtes à intervalle fixe (débit cible), quelle que soit la latence observée."""
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        sent = 0
+        while True:
+            scheduled_at = start + sent * interval
+            if scheduled_at - start >= duration:
+                break
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(timed_issue, client, stats, scheduled_at)
+            sent += 1
+
+def run_closed_loop(client, stats, duration, concurrency):
+    """Chaque worker enchaîne les requêtes sans pause pendant la durée du test."""
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        while time.perf_counter() < deadline:
+            timed_issue(client, stats, time.perf_counter())
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def start_stub_server(port, latency_ms, error_rate):
+    """Démarre un endpoint token local qui imite les réponses de Keycloak/Dex."""
+
+    class StubTokenHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(length).decode())
+            time.sleep(latency_ms / 1000)
+            if random.random() < error_rate:
+                status, body = 503, {"error": "temporarily_unavailable"}
+            elif form.get("grant_type", [""])[0] not in ("password", "client_credentials", "refresh_token"):
+                status, body = 400, {"error": "unsupported_grant_type"}
+            else:
+                status, body = 200, {
+                    "access_token": f"stub-{random.getrandbits(64):x}",
+                    "refresh_token": f"stub-refresh-{random.getrandbits(64):x}",
+                    "token_type": "Bearer",
+                    "expires_in": 300
+                }
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubTokenHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    """Fonction principale du script."""
+    args = parse_arguments()
+
+    if args.stub:
+        start_stub_server(args.stub_port, args.stub_latency_ms, args.stub_error_rate)
+        token_url = f"http://127.0.0.1:{args.stub_port}/token"
+        print(f"Endpoint token de substitution démarré sur {token_url}")
+    else:
+        token_url = args.token_url or f"{args.keycloak_url}/realms/{args.realm}/protocol/openid-connect/token"
+
+    users = []
+    if args.grant in ("password", "refresh_token"):
+        if args.users_csv:
+            users = load_users(args.users_csv)
+        elif args.stub:
+            users = [{"username": "user", "password": "password", "refresh_token": None}]
+        if not users:
+            print("Le grant choisi nécessite un pool d'utilisateurs (--users-csv username,password).")
+            return 1
+
+    client = TokenClient(args, token_url, users)
+    stats = LoadStats()
+    mode = f"boucle ouverte à {args.rate:g} req/s" if args.rate else f"boucle fermée, {args.concurrency} workers"
+    print(f"Test de charge '{args.grant}' sur {token_url} ({mode}, {args.duration:g}s)")
+
+    if args.rate:
+        runner = threading.Thread(target=run_open_loop,
+                                  args=(client, stats, args.rate, args.duration, args.concurrency), daemon=True)
+    else:
+        runner = threading.Thread(target=run_closed_loop,
+                                  args=(client, stats, args.duration, args.concurrency), daemon=True)
+
+    start = time.perf_counter()
+    last_report = start
+    runner.start()
+    while runner.is_alive():
+        runner.join(timeout=args.report_interval)
+        now = time.perf_counter()
+        histogram, errors = stats.rotate()
+        print(format_report(f"[{now - start:6.1f}s]", now - last_report, histogram, errors))
+        last_report = now
+
+    elapsed = time.perf_counter() - start
+    print("\n=== RÉSULTAT ===")
+    print(format_report("[total  ]", elapsed, stats.total, stats.total_errors))
+    return 0 if stats.total.total else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+import json
+import time
+import sqlite3
+import urllib3
+import requests
+import argparse
+import sys
+from datetime import datetime, timezone
+
+# Désactiver les avertissements liés aux certificats SSL
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    realm TEXT NOT NULL,
+    id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    email TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    enabled INTEGER,
+    PRIMARY KEY (realm, id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_username ON users (realm, username);
+CREATE INDEX IF NOT EXISTS users_email ON users (realm, email);
+
+CREATE TABLE IF NOT EXISTS groups (
+    realm TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    parent_id TEXT,
+    PRIMARY KEY (realm, id)
+);
+CREATE INDEX IF NOT EXISTS groups_path ON groups (realm, path);
+
+CREATE TABLE IF NOT EXISTS memberships (
+    realm TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    group_id TEXT NOT NULL,
+    PRIMARY KEY (realm, user_id, group_id)
+);
+CREATE INDEX IF NOT EXISTS memberships_group ON memberships (realm, group_id);
+
+CREATE TABLE IF NOT EXISTS clients (
+    realm TEXT NOT NULL,
+    id TEXT NOT NULL,
+    client_id TEXT NOT NULL,
+    name TEXT,
+    enabled INTEGER,
+    public_client INTEGER,
+    PRIMARY KEY (realm, id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS clients_client_id ON clients (realm, client_id);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    realm TEXT PRIMARY KEY,
+    last_full_sync REAL,
+    last_event_time INTEGER,
+    last_sync REAL,
+    last_event_ids TEXT
+);
+"""
+
+def parse_arguments():
+    """Parse les arguments de ligne de commande."""
+    parser = argparse.ArgumentParser(description="Miroir local (SQLite) des utilisateurs, groupes et clients d'un realm Keycloak")
+
+    # Paramètres de connexion à Keycloak
+    parser.add_argument("--keycloak-url", default="http://localhost:8080", help="URL de Keycloak")
+    parser.add_argument("--admin-user", default="admin", help="Nom d'utilisateur administrateur")
+    parser.add_argument("--admin-password", default="admin", help="Mot de passe administrateur")
+    parser.add_argument("--realm", default="KC_AAS", help="Realm cible")
+    parser.add_argument("--db", default="kc_aas_mirror.db", help="Fichier SQLite du miroir")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync", help="Synchronise le miroir (complet la première fois, puis incrémental)")
+    sync_parser.add_argument("--full", action="store_true", help="Force un rechargement complet du realm")
+
+    user_parser = subparsers.add_parser("user", help="Vérifie l'existence d'un utilisateur dans le miroir")
+    user_parser.add_argument("username", help="Nom d'utilisateur")
+
+    client_parser = subparsers.add_parser("client", help="Vérifie l'existence d'un client dans le miroir")
+    client_parser.add_argument("client_id", help="ID du client (clientId)")
+
+    member_parser = subparsers.add_parser("member", help="Vérifie l'appartenance d'un utilisateur à un groupe")
+    member_parser.add_argument("username", help="Nom d'utilisateur")
+    member_parser.add_argument("group_path", help="Chemin du groupe (ex: /users)")
+
+    return parser.parse_args()
+
+def get_admin_token(keycloak_url, admin_user, admin_password):
+    """Obtient un token d'accès administrateur pour Keycloak."""
+    token_url = f"{keycloak_url}/realms/master/protocol/openid-connect/token"
+    payload = {
+        "username": admin_user,
+        "password": admin_password,
+        "grant_type": "password",
+        "client_id": "admin-cli"
+    }
+
+    try:
+        response = requests.post(token_url, data=payload, verify=False)
+        response.raise_for_status()
+        return response.json()["access_token"]
+    except Exception as e:
+        print(f"Erreur lors de l'obtention du token: {e}")
+        return None
+
+def open_mirror(db_path):
+    """Ouvre (et initialise si besoin) la base SQLite du miroir."""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    # Miroirs créés avant l'ajout de last_sync et last_event_ids
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(sync_state)")}
+    if "last_sync" not in columns:
+        conn.execute("ALTER TABLE sync_state ADD COLUMN last_sync REAL")
+    if "last_event_ids" not in columns:
+        conn.execute("ALTER TABLE sync_state ADD COLUMN last_event_ids TEXT")
+    return conn
+
+# Lecture du miroir (utilisée par les autres scripts)
+
+def mirror_is_fresh(conn, realm_name, max_age):
+    """Indique si le realm a été synchronisé il y a moins de max_age secondes.
+
+    Un miroir plus ancien ne doit pas être consulté: une ressource supprimée depuis y figurerait encore.
+    """
+    row = conn.execute("SELECT last_sync FROM sync_state WHERE realm = ?", (realm_name,)).fetchone()
+    return bool(row and row[0]) and time.time() - row[0] <= max_age
+
+def mirror_find_user(conn, realm_name, username):
+    """Retourne l'utilisateur du miroir (dict) ou None."""
+    row = conn.execute(
+        "SELECT id, username, email, first_name, last_name, enabled FROM users WHERE realm = ? AND username = ?",
+        (realm_name, username.lower())
+    ).fetchone()
+    if not row:
+        return None
+    return {
+        "id": row[0], "username": row[1], "email": row[2],
+        "firstName": row[3], "lastName": row[4], "enabled": bool(row[5])
+    }
+
+def mirror_find_client(conn, realm_name, client_id_value):
+    """Retourne le client du miroir (dict) ou None."""
+    row = conn.execute(
+        "SELECT id, client_id, name, enabled, public_client FROM clients WHERE realm = ? AND client_id = ?",
+        (realm_name, client_id_value)
+    ).fetchone()
+    if not row:
+        return None
+    return {"id": row[0], "clientId": row[1], "name": row[2], "enabled": bool(row[3]), "publicClient": bool(row[4])}
+
+def mirror_user_groups(conn, realm_name, user_id):
+    """Retourne les groupes (id, name, path) d'un utilisateur du miroir."""
+    rows = conn.execute(
+        "SELECT g.id, g.name, g.path FROM memberships m "
+        "JOIN groups g ON g.realm = m.realm AND g.id = m.group_id "
+        "WHERE m.realm = ? AND m.user_id = ? ORDER BY g.path",
+        (realm_name, user_id)
+    ).fetchall()
+    return [{"id": row[0], "name": row[1], "path": row[2]} for row in rows]
+
+def mirror_is_member(conn, realm_name, username, group_path):
+    """Indique si un utilisateur appartient au groupe de chemin group_path."""
+    row = conn.execute(
+        "SELECT 1 FROM users u "
+        "JOIN memberships m ON m.realm = u.realm AND m.user_id = u.id "
+        "JOIN groups g ON g.realm = m.realm AND g.id = m.group_id "
+        "WHERE u.realm = ? AND u.username = ? AND g.path = ?",
+        (realm_name, username.lower(), group_path)
+    ).fetchone()
+    return row is not None
+
+# Chargement depuis Keycloak
+
+def get_json(session, url, params=None):
+    """GET JSON sur l'API admin; retourne None si la ressource n'existe plus (404)."""
+    response = session.get(url, params=params, verify=False)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+def get_paged(session, url, params=None):
+    """Parcourt une ressource paginée (first/max) de l'API admin."""
+    first = 0
+    while True:
+        page_params = dict(params or {}, first=first, max=PAGE_SIZE)
+        page = get_json(session, url, page_params) or []
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        first += PAGE_SIZE
+
+def upsert_user(conn, realm_name, user):
+    conn.execute(
+        "INSERT OR REPLACE INTO users (realm, id, username, email, first_name, last_name, enabled) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (realm_name, user["id"], user["username"].lower(), user.get("email"),
+         user.get("firstName"), user.get("lastName"), int(user.get("enabled", False)))
+    )
+
+def upsert_client(conn, realm_name, client):
+    conn.execute(
+        "INSERT OR REPLACE INTO clients (realm, id, client_id, name, enabled, public_client) VALUES (?, ?, ?, ?, ?, ?)",
+        (realm_name, client["id"], client["clientId"], client.get("name"),
+         int(client.get("enabled", False)), int(client.get("publicClient", False)))
+    )
+
+def fetch_groups(session, base_url, groups=None, parent_id=None):
+    """Retourne la liste à plat des groupes du realm (avec sous-groupes)."""
+    if groups is None:
+        groups = get_json(session, f"{base_url}/groups", {"briefRepresentation": "false", "max": 100000}) or []
+    result = []
+    for group in groups:
+        result.append((group["id"], group["name"], group["path"], parent_id))
+        children = group.get("subGroups") or []
+        if not children and group.get("subGroupCount"):
+            children = list(get_paged(session, f"{base_url}/groups/{group['id']}/children"))
+        result.extend(fetch_groups(session, base_url, children, group["id"]))
+    return result
+
+def replace_groups(conn, session, base_url, realm_name):
+    """Recharge l'arborescence des groupes (les groupes sont peu nombreux)."""
+    groups = fetch_groups(session, base_url)
+    conn.execute("DELETE FROM groups WHERE realm = ?", (realm_name,))
+    conn.executemany(
+        "INSERT INTO groups (realm, id, name, path, parent_id) VALUES (?, ?, ?, ?, ?)",
+        [(realm_name,) + group for group in groups]
+    )
+    conn.execute(
+        "DELETE FROM memberships WHERE realm = ? AND group_id NOT IN (SELECT id FROM groups WHERE realm = ?)",
+        (realm_name, realm_name)
+    )
+    return groups
+
+def refresh_user(conn, session, base_url, realm_name, user_id):
+    """Recharge un utilisateur et ses groupes (le supprime s'il n'existe plus)."""
+    user = get_json(session, f"{base_url}/users/{user_id}")
+    conn.execute("DELETE FROM memberships WHERE realm = ? AND user_id = ?", (realm_name, user_id))
+    if user is None:
+        conn.execute("DELETE FROM users WHERE realm = ? AND id = ?", (realm_name, user_id))
+        return
+    upsert_user(conn, realm_name, user)
+    for group in get_paged(session, f"{base_url}/users/{user_id}/groups"):
+        conn.execute(
+            "INSERT OR IGNORE INTO memberships (realm, user_id, group_id) VALUES (?, ?, ?)",
+            (realm_name, user_id, group["id"])
+        )
+
+def refresh_client(conn, session, base_url, realm_name, client_uuid):
+    """Recharge un client (le supprime s'il n'existe plus)."""
+    client = get_json(session, f"{base_url}/clients/{client_uuid}")
+    if client is None:
+        conn.execute("DELETE FROM clients WHERE realm = ? AND id = ?", (realm_name, client_uuid))
+    else:
+        upsert_client(conn, realm_name, client)
+
+def admin_event_key(event):
+    """Identifiant d'un événement admin (id Keycloak si présent, sinon empreinte de ses champs)."""
+    return event.get("id") or json.dumps(event, sort_keys=True)
+
+def latest_admin_event_cursor(session, base_url):
+    """Retourne le curseur des événements admin: (horodatage ms du plus récent, ids à cet instant)."""
+    events = get_json(session, f"{base_url}/admin-events", {"first": 0, "max": PAGE_SIZE}) or []
+    if not events:
+        return 0, set()
+    latest = max(event["time"] for event in events)
+    return latest, {admin_event_key(event) for event in events if event["time"] == latest}
+
+def full_sync(conn, session, base_url, realm_name):
+    """Charge l'intégralité du realm dans le miroir (dans une seule transaction)."""
+    # Curseur pris avant le chargement: les modifications concurrentes seront rejouées
+    cursor, cursor_ids = latest_admin_event_cursor(session, base_url)
+
+    with conn:
+        for table in ("users", "memberships", "clients"):
+            conn.execute(f"DELETE FROM {table} WHERE realm = ?", (realm_name,))
+
+        user_count = 0
+        for user in get_paged(session, f"{base_url}/users", {"briefRepresentation": "true"}):
+            upsert_user(conn, realm_name, user)
+            user_count += 1
+
+        groups = replace_groups(conn, session, base_url, realm_name)
+        for group_id, _, _, _ in groups:
+            conn.executemany(
+                "INSERT OR IGNORE INTO memberships (realm, user_id, group_id) VALUES (?, ?, ?)",
+                [(realm_name, member["id"], group_id)
+                 for member in get_paged(session, f"{base_url}/groups/{group_id}/members", {"briefRepresentation": "true"})]
+            )
+
+        client_count = 0
+        for client in get_paged(session, f"{base_url}/clients"):
+            upsert_client(conn, realm_name, client)
+            client_count += 1
+
+        conn.execute(
+            "INSERT OR REPLACE INTO sync_state (realm, last_full_sync, last_event_time, last_sync, last_event_ids) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (realm_name, time.time(), cursor, time.time(), json.dumps(sorted(cursor_ids)))
+        )
+
+    print(f"Synchronisation complète du realm '{realm_name}': {user_count} utilisateurs, {len(groups)} groupes, {client_count} clients.")
+
+def incremental_sync(conn, session, base_url, realm_name, cursor, cursor_ids):
+    """Rejoue les événements admin postérieurs au curseur et ne recharge que les ressources touchées.
+
+    Nécessite l'activation des événements admin dans le realm.
+    """
+    # dateFrom est au jour près: les événements déjà vus sont filtrés sur leur horodatage
+    date_from = datetime.fromtimestamp(cursor / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+    users, clients = set(), set()
+    groups_changed = False
+    new_cursor, new_cursor_ids = cursor, set(cursor_ids)
+
+    # Les événements sont renvoyés du plus récent au plus ancien: on s'arrête avant le curseur.
+    # À l'instant du curseur, seuls les événements déjà vus (cursor_ids) sont ignorés.
+    for event in get_paged(session, f"{base_url}/admin-events", {"dateFrom": date_from}):
+        if event["time"] < cursor:
+            break
+        key = admin_event_key(event)
+        if event["time"] == cursor and key in cursor_ids:
+            continue
+        if event["time"] > new_cursor:
+            new_cursor, new_cursor_ids = event["time"], {key}
+        elif event["time"] == new_cursor:
+            new_cursor_ids.add(key)
+        parts = (event.get("resourcePath") or "").split("/")
+        resource_type = event.get("resourceType")
+        if parts[0] == "users" and len(parts) > 1:
+            users.add(parts[1])
+        elif parts[0] == "groups" or resource_type == "GROUP":
+            groups_changed = True
+        elif parts[0] == "clients" and len(parts) > 1:
+            clients.add(parts[1])
+
+    with conn:
+        if groups_changed:
+            replace_groups(conn, session, base_url, realm_name)
+        for user_id in users:
+            refresh_user(conn, session, base_url, realm_name, user_id)
+        for client_uuid in clients:
+            refresh_client(conn, session, base_url, realm_name, client_uuid)
+        conn.execute("UPDATE sync_state SET last_event_time = ?, last_event_ids = ?, last_sync = ? WHERE realm = ?",
+                     (new_cursor, json.dumps(sorted(new_cursor_ids)), time.time(), realm_name))
+
+    print(f"Synchronisation incrémentale du realm '{realm_name}': {len(users)} utilisateurs, "
+          f"{len(clients)} clients mis à jour{', groupes rechargés' if groups_changed else ''}.")
+
+def sync_realm(conn, token, keycloak_url, realm_name, full=False):
+    """Synchronise le miroir: complet si demandé ou si le realm n'a jamais été chargé."""
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token}"
+    base_url = f"{keycloak_url}/admin/realms/{realm_name}"
+
+    state = conn.execute(
+        "SELECT last_event_time, last_event_ids FROM sync_state WHERE realm = ?", (realm_name,)
+    ).fetchone()
+    if full or state is None or not state[0]:
+        full_sync(conn, session, base_url, realm_name)
+    else:
+        incremental_sync(conn, session, base_url, realm_name, state[0], set(json.loads(state[1] or "[]")))
+
+def main():
+    """Fonction principale du script."""
+    args = parse_arguments()
+    conn = open_mirror(args.db)
+
+    if args.command == "sync":
+        token = get_admin_token(args.keycloak_url, args.admin_user, args.admin_password)
+        if not token:
+            print("Impossible d'obtenir un token d'accès. Arrêt du script.")
+            return 1
+        try:
+            sync_realm(conn, token, args.keycloak_url, args.realm, args.full)
+        except Exception as e:
+            print(f"Erreur lors de la synchronisation du miroir: {e}")
+            return 1
+        return 0
+
+    if args.command == "user":
+        user = mirror_find_user(conn, args.realm, args.username)
+        if not user:
+            print(f"L'utilisateur '{args.username}' n'existe pas dans le miroir du realm '{args.realm}'.")
+            return 1
+        groups = mirror_user_groups(conn, args.realm, user["id"])
+        print(f"L'utilisateur '{args.username}' existe dans le realm '{args.realm}'. ID: {user['id']}")
+        if groups:
+            print(f"Groupes: {', '.join(g['path'] for g in groups)}")
+        return 0
+
+    if args.command == "client":
+        client = mirror_find_client(conn, args.realm, args.client_id)
+        if not client:
+            print(f"Le client '{args.client_id}' n'existe pas dans le miroir du realm '{args.realm}'.")
+            return 1
+        print(f"Le client '{args.client_id}' existe dans le realm '{args.realm}'. ID: {client['id']}")
+        return 0
+
+    if args.command == "member":
+        if mirror_is_member(conn, args.realm, args.username, args.group_path):
+            print(f"L'utilisateur '{args.username}' est membre du groupe '{args.group_path}'.")
+            return 0
+        print(f"L'utilisateur '{args.username}' n'est pas membre du groupe '{args.group_path}'.")
+        return 1
+
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())